@@ -16,6 +16,34 @@ class Config(object):
 
     NUMBER_PER_PAGE = 9
 
+    # answer user searches from the in-process match index instead of sql
+    MATCH_INDEX_ENABLED = True
+    # rebuild the match index from the db after this many secs, so that writes
+    # handled by other processes show up
+    MATCH_INDEX_REFRESH_IN_SECS = 300
+    # max number of users waiting for their matches to be updated, per process
+    MATCH_UPDATE_QUEUE_SIZE = 10000
+
+    # number of rows fetched per round trip from the server-side cursor of an export
+    EXPORT_BATCH_SIZE = 500
+
+    # json encoder of the responses: 'orjson', 'ujson', 'json', or 'auto' for the fastest one installed
+    JSON_ENCODER = 'auto'
+
+    # max number of ids in one GET /users/?ids=
+    BATCH_USER_IDS_MAX = 100
+
+    # gzip or deflate json responses of at least this many bytes, when the client accepts it
+    COMPRESSION_THRESHOLD_IN_BYTES = 1024
+    # 1 is fastest, 9 compresses most
+    COMPRESSION_LEVEL = 6
+
+    # session tokens issued on authentication: 'guid', checked against redis, or 'signed', carrying
+    # the user id, session generation and expiry signed with SECRET_KEY. tokens of either format are accepted
+    TOKEN_FORMAT = 'guid'
+    # signed tokens can not be extended, so they live this long from authentication
+    SIGNED_TOKEN_TIMEOUT_IN_SECS = 86400
+
     LOGGING = {
         'log_file_path': '/var/www/roommate/log/pyws.log',
         'level': logging.DEBUG,
@@ -28,6 +56,16 @@ class Config(object):
     REDIS_HOST = 'localhost'
     REDIS_PORT = 6379
     REDIS_DB = 0
+    # connections per client and process; a command waits up to REDIS_POOL_TIMEOUT_IN_SECS for a free one
+    REDIS_MAX_CONNECTIONS = 50
+    REDIS_POOL_TIMEOUT_IN_SECS = 1
+    REDIS_SOCKET_CONNECT_TIMEOUT_IN_SECS = 1
+    REDIS_SOCKET_TIMEOUT_IN_SECS = 1
+    # retry a command once on a new connection when it timed out. off, because a command that timed out may
+    # still have run, and the lua scripts, e.g. of the rate limiter, would then count twice
+    REDIS_RETRY_ON_TIMEOUT = False
+    # ping connections that were idle for this many secs before using them, None to never ping
+    REDIS_HEALTH_CHECK_INTERVAL_IN_SECS = 30
     # REDIS_URL = 'redis://localhost:6379/0'
 
     ###################################################################################################################
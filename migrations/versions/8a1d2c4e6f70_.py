@@ -0,0 +1,29 @@
+"""add user birth_year
+
+Revision ID: 8a1d2c4e6f70
+Revises: 3cbe57fd0169
+Create Date: 2026-10-18 09:12:41.204518
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8a1d2c4e6f70'
+down_revision = '3cbe57fd0169'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('user', sa.Column('birth_year', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_user_birth_year'), 'user', ['birth_year'], unique=False)
+
+    # backfill from the age as it was when it was last modified
+    op.execute('UPDATE "user" '
+               'SET birth_year = CAST(EXTRACT(YEAR FROM COALESCE(age_last_modified, now())) AS INTEGER) - age '
+               'WHERE age IS NOT NULL')
+
+
+def downgrade():
+    op.drop_index(op.f('ix_user_birth_year'), table_name='user')
+    op.drop_column('user', 'birth_year')
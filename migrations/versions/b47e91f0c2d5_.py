@@ -0,0 +1,36 @@
+"""add user search_vector
+
+Revision ID: b47e91f0c2d5
+Revises: 8a1d2c4e6f70
+Create Date: 2026-10-18 11:03:27.518220
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b47e91f0c2d5'
+down_revision = '8a1d2c4e6f70'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.add_column('user', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.create_index('ix_user_search_vector', 'user', ['search_vector'], unique=False, postgresql_using='gin')
+
+    # keep search_vector in sync with the descriptions on every insert and update
+    op.execute('CREATE TRIGGER user_search_vector_update '
+               'BEFORE INSERT OR UPDATE OF short_description, long_description ON "user" '
+               'FOR EACH ROW EXECUTE PROCEDURE '
+               'tsvector_update_trigger(search_vector, \'pg_catalog.english\', short_description, long_description)')
+
+    op.execute('UPDATE "user" '
+               'SET search_vector = to_tsvector(\'pg_catalog.english\', '
+               'coalesce(short_description, \'\') || \' \' || coalesce(long_description, \'\'))')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER user_search_vector_update ON "user"')
+    op.drop_index('ix_user_search_vector', table_name='user')
+    op.drop_column('user', 'search_vector')
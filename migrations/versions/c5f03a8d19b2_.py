@@ -0,0 +1,33 @@
+"""add preference budget range index
+
+Revision ID: c5f03a8d19b2
+Revises: b47e91f0c2d5
+Create Date: 2026-10-18 12:40:09.331874
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5f03a8d19b2'
+down_revision = 'b47e91f0c2d5'
+
+from alembic import op
+
+
+def upgrade():
+    # int4range() rejects inverted bounds, so fix them before constraining
+    op.execute('UPDATE preference '
+               'SET budget_min = budget_max, budget_max = budget_min '
+               'WHERE budget_min > budget_max')
+    op.create_check_constraint('ck_preference_budget_range',
+                               'preference',
+                               'budget_min IS NULL OR budget_max IS NULL OR budget_min <= budget_max')
+
+    op.execute('CREATE INDEX ix_preference_budget_range ON preference '
+               'USING gist (int4range(budget_min, budget_max, \'[]\'))')
+    op.create_index('ix_preference_household_size', 'preference', ['household_size'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_preference_household_size', table_name='preference')
+    op.drop_index('ix_preference_budget_range', table_name='preference')
+    op.drop_constraint('ck_preference_budget_range', 'preference', type_='check')
@@ -0,0 +1,22 @@
+"""add user version
+
+Revision ID: d92e4b7a15c3
+Revises: c5f03a8d19b2
+Create Date: 2026-10-18 15:02:37.518046
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd92e4b7a15c3'
+down_revision = 'c5f03a8d19b2'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('user', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'version')
@@ -26,6 +26,7 @@ def create_app(config_name):
     # app lever interface
     from pyws.interface import user
     from pyws.interface import file_upload
+    from pyws.interface import stats
 
     app.register_blueprint(latest)
 
@@ -1,8 +1,59 @@
 DEFAULT_TIMEOUT_IN_SECS = 600
 PASSWORD_RESET_TIMEOUT_IN_SECS = 300
+SEARCH_RESULT_TIMEOUT_IN_SECS = 300
+FACET_COUNTS_TIMEOUT_IN_SECS = 30
+USER_DOC_TIMEOUT_IN_SECS = 600
+USER_DOC_LOCK_TIMEOUT_IN_SECS = 5
+USER_FRAGMENT_TIMEOUT_IN_SECS = 600
 
 USER_TOKEN_KEY = 'user:{user_id}'
 TOKEN_USER_KEY = 'token:{token}'
 PASSWORD_RESET_TOKEN_USER_KEY = 'password_reset_token:{token}'
 
-REQUEST_LIMIT_KEY = 'rl:{endpoint}:{ip}'
+# bumped to void the signed tokens of a user, kept as long as tokens of its current value live
+SESSION_GENERATION_KEY = 'session_generation:{user_id}'
+
+# serialized user including preference, and the lock held while refilling it
+USER_DOC_KEY = 'user_doc:{user_id}'
+USER_DOC_LOCK_KEY = 'user_doc_lock:{user_id}'
+# latest version written, a doc loaded at an older version is never cached
+USER_DOC_VERSION_KEY = 'user_doc_version:{user_id}'
+
+# serialized user as it appears in list responses, at a given row version, with the requested fields
+# ('all' or the field names joined by ',')
+USER_FRAGMENT_KEY = 'user_json:{user_id}:{version}:{fields}'
+
+# originator is the ip, or 'user:{id}' for limits by user
+REQUEST_LIMIT_KEY = 'rl:{endpoint}:{originator}'
+
+# bumped on every user write, so cached search results of older generations are never read again
+SEARCH_GENERATION_KEY = 'search_generation'
+# hash of the serialized 'result' and its 'etag'
+SEARCH_RESULT_KEY = 'search_result:{generation}:{digest}'
+
+# sorted set of the most compatible users, member is user id and score is compatibility
+USER_MATCHES_KEY = 'matches:{user_id}'
+USER_MATCHES_TOP_K = 100
+# only member of the matches of a user with no match, so the empty list is cached too; ranks below every match
+USER_MATCHES_EMPTY_MEMBER = 'none'
+USER_MATCHES_EMPTY_SCORE = -1
+# sorted set of the users with cached matches, scored by the lowest score a new match needs to enter them:
+# the last score of a full list, 0 otherwise
+USER_MATCHES_THRESHOLDS_KEY = 'matches_thresholds'
+# set of the users whose cached matches may hold the user, stale members are dropped when they are checked
+USER_MATCHED_BY_KEY = 'matched_by:{user_id}'
+
+# per-process cache in front of redis for hot keys, by key family.
+# a max_size or timeout_in_sec of 0 turns the family off
+LOCAL_CACHE_POLICIES = {
+    'user_doc': {'max_size': 10000, 'timeout_in_sec': 30},
+    'token': {'max_size': 10000, 'timeout_in_sec': 10},
+    # session generations of signed tokens, evicted through pub/sub when a user is revoked. short lived,
+    # as a revoke published before this process subscribed is missed
+    'session_generation': {'max_size': 10000, 'timeout_in_sec': 10},
+    # only over-limit verdicts are cached, until a request would be allowed again
+    'rate_limit': {'max_size': 10000, 'timeout_in_sec': 60}
+}
+
+# writes publish '{family}:{key}' here so every process evicts its local copy
+LOCAL_CACHE_INVALIDATION_CHANNEL = 'local_cache_invalidation'
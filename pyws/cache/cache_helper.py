@@ -1,26 +1,293 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import namedtuple
+
+from config import Config
+
+from pyws.helper import json_helper, string_helper
+
 from pyws.cache.redis_connector import RedisStore
+from pyws.cache.local_cache import LocalCache, InvalidationSubscriber, RateLimitLease
 from pyws.cache.cache_constants import DEFAULT_TIMEOUT_IN_SECS, PASSWORD_RESET_TIMEOUT_IN_SECS
+from pyws.cache.cache_constants import SEARCH_RESULT_TIMEOUT_IN_SECS, SEARCH_GENERATION_KEY, SEARCH_RESULT_KEY
 from pyws.cache.cache_constants import USER_TOKEN_KEY, TOKEN_USER_KEY, PASSWORD_RESET_TOKEN_USER_KEY
+from pyws.cache.cache_constants import SESSION_GENERATION_KEY
+from pyws.cache.cache_constants import USER_MATCHES_KEY, USER_MATCHES_TOP_K
+from pyws.cache.cache_constants import USER_MATCHES_EMPTY_MEMBER, USER_MATCHES_EMPTY_SCORE
+from pyws.cache.cache_constants import USER_MATCHES_THRESHOLDS_KEY, USER_MATCHED_BY_KEY
+from pyws.cache.cache_constants import USER_DOC_KEY, USER_DOC_LOCK_KEY, USER_DOC_VERSION_KEY
+from pyws.cache.cache_constants import USER_DOC_TIMEOUT_IN_SECS, USER_DOC_LOCK_TIMEOUT_IN_SECS
+from pyws.cache.cache_constants import USER_FRAGMENT_KEY, USER_FRAGMENT_TIMEOUT_IN_SECS
+from pyws.cache.cache_constants import LOCAL_CACHE_POLICIES, LOCAL_CACHE_INVALIDATION_CHANNEL
 
 _redis_store = RedisStore()
+# for values kept as encoded bytes, e.g. serialized json
+_binary_redis_store = RedisStore(decode_responses=False)
 
+# outcome of one rate limited request, remaining counts this request
+RateLimit = namedtuple('RateLimit', ['allowed', 'limit', 'remaining', 'reset_in_sec', 'retry_after_in_sec'])
 
-def verify_auth_token(token):
-    if _redis_store.hgetall(TOKEN_USER_KEY.format(token=token)):
-        return True
-    return False
+# sliding window log: a sorted set of the request times, in microseconds, within the window.
+# ARGV is limit, window in secs, requests to take, then leased requests handed back unused.
+# Returns {requests granted, remaining, usecs until the window is empty,
+#          usecs until a request is allowed, lease id}
+_RATE_LIMIT_SCRIPT = _redis_store.register_script("""
+redis.replicate_commands()
 
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2]) * 1000000
+local cost = tonumber(ARGV[3])
 
-def delete_cached_auth_keys_by_token(token):
-    user_id = _redis_store.hgetall(TOKEN_USER_KEY.format(token=token))['id']
-    _redis_store.expire(USER_TOKEN_KEY.format(user_id=user_id))
-    _redis_store.expire(TOKEN_USER_KEY.format(token=token))
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local now_str = time[1] .. string.format('%06d', tonumber(time[2]))
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local lease_id = now_str .. '-' .. redis.call('ZCARD', key)
+
+if #ARGV > 3 then
+    redis.call('ZREM', key, unpack(ARGV, 4))
+end
+
+local count = redis.call('ZCARD', key)
+local granted = math.max(math.min(cost, limit - count), 0)
+
+if granted > 0 then
+    local members = {}
+    for i = 0, granted - 1 do
+        members[#members + 1] = now_str
+        members[#members + 1] = lease_id .. ':' .. i
+    end
+    redis.call('ZADD', key, unpack(members))
+    redis.call('PEXPIRE', key, math.ceil(window / 1000))
+    count = count + granted
+end
+
+local retry_after = 0
+local reset = 0
+if count > 0 then
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+    local newest = redis.call('ZRANGE', key, -1, -1, 'WITHSCORES')
+    reset = tonumber(newest[2]) + window - now
+    if count >= limit then
+        retry_after = tonumber(oldest[2]) + window - now
+    end
+end
+
+return {granted, limit - count, reset, retry_after, lease_id}
+""")
+
+# KEYS[1] is the token key, ARGV[1] is the session timeout in secs.
+# Returns the fields of the token hash after extending it, or {} if there is no session
+_RESOLVE_SESSION_SCRIPT = _redis_store.register_script("""
+local token_user = redis.call('HGETALL', KEYS[1])
+
+for i = 1, #token_user, 2 do
+    if token_user[i] == 'id' then
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+        return token_user
+    end
+end
+
+return {}
+""")
+
+# KEYS are the matches thresholds, the matched by set of the member to add, then cached matches.
+# ARGV is the member to add, top k, the empty member, then an owner user id and a score per cached matches.
+# Matches that were never computed are left alone, a single member would pass for the whole list
+_ADD_TO_MATCHES_SCRIPT = _redis_store.register_script("""
+local top_k = tonumber(ARGV[2])
+local owners = #KEYS - 2
+
+for i = 1, owners do
+    local key = KEYS[2 + i]
+    local owner = ARGV[3 + i]
+
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZREM', key, ARGV[3])
+        redis.call('ZADD', key, ARGV[3 + owners + i], ARGV[1])
+        redis.call('ZREMRANGEBYRANK', key, 0, -(top_k + 1))
+        redis.call('SADD', KEYS[2], owner)
+
+        local threshold = 0
+        if redis.call('ZCARD', key) >= top_k then
+            threshold = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')[2]
+        end
+        redis.call('ZADD', KEYS[1], threshold, owner)
+    end
+end
+""")
+
+# KEYS are pairs of a user doc key and its version key, ARGV is the timeout in secs, then a doc and
+# its version per pair. A doc older than the latest version written is not cached.
+# Returns whether each doc was cached
+_CACHE_USER_DOCS_SCRIPT = _redis_store.register_script("""
+local cached = {}
+
+for i = 1, #KEYS, 2 do
+    local doc = ARGV[i + 1]
+    local version = tonumber(ARGV[i + 2])
+    local latest = tonumber(redis.call('GET', KEYS[i + 1]) or 0)
+
+    if version >= latest then
+        redis.call('SETEX', KEYS[i], ARGV[1], doc)
+        cached[#cached + 1] = 1
+    else
+        cached[#cached + 1] = 0
+    end
+end
+
+return cached
+""")
+
+# leases by rate limit key, striped by key with a lock each. A lease is renewed while holding the lock,
+# so threads that find it used up wait for the new one. Leases are not kept in a size bounded local
+# cache, since a lease evicted for size would never hand its unused requests back. A lease is dropped
+# once past its reset, when its requests have left the window in redis too
+_RATE_LIMIT_LEASE_STRIPES = 64
+_rate_limit_lease_locks = [threading.Lock() for _ in range(_RATE_LIMIT_LEASE_STRIPES)]
+_rate_limit_leases = [{} for _ in range(_RATE_LIMIT_LEASE_STRIPES)]
+
+_local_caches = {family: LocalCache(**policy) for family, policy in LOCAL_CACHE_POLICIES.items()}
+_invalidation_subscriber = InvalidationSubscriber(_redis_store, LOCAL_CACHE_INVALIDATION_CHANNEL, _local_caches)
+
+
+def _local_cache(family):
+    _invalidation_subscriber.ensure_started()
+    return _local_caches[family]
+
+
+def _evict_local(family, key):
+    """
+    Evict a key from the local cache of this process and, through pub/sub, of every other process
+
+    :param family: key family in LOCAL_CACHE_POLICIES
+    :param key:
+    :return:
+    """
+    _local_caches[family].delete(key)
+    _redis_store.publish(LOCAL_CACHE_INVALIDATION_CHANNEL, u'{0}:{1}'.format(family, key))
+
+
+def get_local_cache_stats():
+    """
+    Get the size and hit rate of the local cache of every key family
+
+    :return: {family: stats}
+    """
+    return {family: cache.stats() for family, cache in _local_caches.items()}
+
+
+def resolve_session(token):
+    """
+    Resolve the user of an auth token and extend the session, with at most two round trips to redis
+
+    A token found in the local cache was resolved and extended by this process
+    moments ago, so it is not extended again until the local copy expires.
+
+    Signed tokens are verified in process, and only their revocation is looked up.
+
+    :param token:
+    :return: user id, None if the token is not a valid session
+    """
+    if token is None:
+        return None
+
+    if string_helper.is_signed_token(token):
+        return _resolve_signed_session(token)
+
+    key = TOKEN_USER_KEY.format(token=token)
+    token_user = _local_cache('token').get(key)
+
+    if token_user is None:
+        fields = _RESOLVE_SESSION_SCRIPT(keys=[key], args=[DEFAULT_TIMEOUT_IN_SECS])
+        token_user = dict(zip(fields[::2], fields[1::2]))
+        if not token_user:
+            return None
+
+        # the user key is named after the user id, which the script only finds out, so it can not be
+        # declared in its KEYS
+        _redis_store.expire(USER_TOKEN_KEY.format(user_id=token_user['id']), DEFAULT_TIMEOUT_IN_SECS)
+        _local_cache('token').set(key, token_user)
+
+    return int(token_user['id'])
+
+
+def _resolve_signed_session(token):
+    verified = string_helper.verify_signed_token(token, Config.SECRET_KEY)
+    if verified is None:
+        return None
+
+    user_id, generation = verified
+    if generation != _get_session_generation(user_id):
+        return None
+
+    return user_id
+
+
+def _get_session_generation(user_id):
+    key = SESSION_GENERATION_KEY.format(user_id=user_id)
+    local_cache = _local_cache('session_generation')
+    generation = local_cache.get(key)
+
+    if generation is None:
+        # a revoke evicted between the read and the set would leave the old generation cached
+        deletions = local_cache.deletions
+        # 0 is cached too, most users were never revoked
+        generation = int(_redis_store.get(key) or 0)
+        local_cache.set(key, generation, if_not_deleted_since=deletions)
+
+    return generation
+
+
+def get_session_generation_to_sign(user_id):
+    """
+    Get the session generation of a user for a new signed token, keeping it as long as the token lives
+
+    :param user_id:
+    :return:
+    """
+    key = SESSION_GENERATION_KEY.format(user_id=user_id)
+
+    pipe = _redis_store.pipeline()
+    pipe.get(key)
+    # a no-op for users that were never revoked
+    pipe.expire(key, Config.SIGNED_TOKEN_TIMEOUT_IN_SECS)
+    generation, _ = pipe.execute()
+
+    return int(generation or 0)
+
+
+def revoke_sessions(user_id):
+    """
+    End every session of a user, of guid and signed tokens alike
+
+    Signed tokens are voided by bumping the session generation they carry, so no clock is compared.
+
+    :param user_id:
+    :return:
+    """
+    delete_cached_auth_keys_by_user_id(user_id)
+
+    key = SESSION_GENERATION_KEY.format(user_id=user_id)
+
+    pipe = _redis_store.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, Config.SIGNED_TOKEN_TIMEOUT_IN_SECS)
+    pipe.execute()
+
+    _evict_local('session_generation', key)
 
 
 def delete_cached_auth_keys_by_user_id(user_id):
     token = _redis_store.get(USER_TOKEN_KEY.format(user_id=user_id))
     _redis_store.expire(USER_TOKEN_KEY.format(user_id=user_id))
     _redis_store.expire(TOKEN_USER_KEY.format(token=token))
+    _evict_local('token', TOKEN_USER_KEY.format(token=token))
 
 
 def cache_auth_keys(user, token):
@@ -28,10 +295,205 @@ def cache_auth_keys(user, token):
     _redis_store.set(USER_TOKEN_KEY.format(user_id=user.id), token)
 
 
-def extend_cached_auth_keys(token):
-    user_id = _redis_store.hgetall(TOKEN_USER_KEY.format(token=token))['id']
-    _redis_store.expire(TOKEN_USER_KEY.format(token=token), timeout_in_sec=DEFAULT_TIMEOUT_IN_SECS)
-    _redis_store.expire(USER_TOKEN_KEY.format(user_id=user_id), timeout_in_sec=DEFAULT_TIMEOUT_IN_SECS)
+def get_cached_user_doc(user_id):
+    key = USER_DOC_KEY.format(user_id=user_id)
+    doc = _local_cache('user_doc').get(key)
+
+    if doc is None:
+        doc = _redis_store.get(key)
+        if doc is None:
+            return None
+        _local_cache('user_doc').set(key, doc)
+
+    return json_helper.loads(doc)
+
+
+def cache_user_doc(user_id, doc):
+    cache_user_docs({user_id: doc})
+
+
+def get_cached_user_docs(user_ids):
+    """
+    Get many cached user docs with at most one round trip to redis
+
+    :param user_ids: list of user ids
+    :return: list of docs in the order of the user ids, None where not cached
+    """
+    keys = [USER_DOC_KEY.format(user_id=user_id) for user_id in user_ids]
+    docs = [_local_cache('user_doc').get(key) for key in keys]
+
+    misses = [i for i, doc in enumerate(docs) if doc is None]
+    for i, doc in zip(misses, _redis_store.mget([keys[i] for i in misses])):
+        if doc is not None:
+            _local_cache('user_doc').set(keys[i], doc)
+            docs[i] = doc
+
+    return [json_helper.loads(doc) if doc is not None else None for doc in docs]
+
+
+def cache_user_docs(docs):
+    """
+    Cache many user docs in one round trip
+
+    A doc loaded before a write to the user committed is not cached, since
+    it would outlive the invalidation of that write.
+
+    :param docs: dictionary of user id to doc, with its version
+    :return:
+    """
+    if not docs:
+        return
+
+    keys = []
+    args = [USER_DOC_TIMEOUT_IN_SECS]
+    for user_id, doc in docs.items():
+        keys += [USER_DOC_KEY.format(user_id=user_id), USER_DOC_VERSION_KEY.format(user_id=user_id)]
+        args += [json_helper.dumps(doc), doc['version']]
+
+    cached = _CACHE_USER_DOCS_SCRIPT(keys=keys, args=args)
+
+    for i, is_cached in enumerate(cached):
+        if is_cached:
+            _local_cache('user_doc').set(keys[2 * i], args[2 * i + 1])
+
+
+def invalidate_user_doc(user_id, version):
+    """
+    Drop the cached doc of a user that was just written
+
+    :param user_id:
+    :param version: version of the write, docs of older versions are no longer cached
+    :return:
+    """
+    key = USER_DOC_KEY.format(user_id=user_id)
+
+    pipe = _redis_store.pipeline()
+    pipe.setex(USER_DOC_VERSION_KEY.format(user_id=user_id), USER_DOC_TIMEOUT_IN_SECS, version)
+    pipe.delete(key)
+    pipe.execute()
+
+    _evict_local('user_doc', key)
+
+
+def get_cached_user_fragments(user_versions, fields=None):
+    """
+    Get the serialized users at the given versions
+
+    :param user_versions: list of (user id, version)
+    :param fields: serialized fields, None for all
+    :return: list of json bytes, None where not cached
+    """
+    fields = ','.join(fields) if fields is not None else 'all'
+
+    return _binary_redis_store.mget([USER_FRAGMENT_KEY.format(user_id=user_id, version=version, fields=fields)
+                                     for user_id, version in user_versions])
+
+
+def cache_user_fragments(fragments, fields=None):
+    """
+    Cache serialized users; older versions are never read again and just expire
+
+    :param fragments: dictionary of (user id, version) to json bytes
+    :param fields: serialized fields, None for all
+    :return:
+    """
+    fields = ','.join(fields) if fields is not None else 'all'
+
+    mapping = {USER_FRAGMENT_KEY.format(user_id=user_id, version=version, fields=fields): fragment
+               for (user_id, version), fragment in fragments.items()}
+
+    _binary_redis_store.mset(mapping, timeout_in_sec=USER_FRAGMENT_TIMEOUT_IN_SECS)
+
+
+def check_rate_limit(key, requests, window, lease=1, lease_timeout_in_sec=1):
+    """
+    Count a request against a sliding window limit, atomically and in one round trip
+
+    Over-limit verdicts are remembered in the local cache until a request
+    would be allowed again, so those requests do not reach redis at all.
+
+    With a lease above 1, up to that many requests are taken from redis at once
+    and handed out by this process until they run out or the lease times out;
+    the unused ones are handed back with the next lease. That saves round trips,
+    but leased requests count from when they were leased, and requests leased
+    by one process can't be used by another.
+
+    :param key: rate limit key
+    :param requests: max number of requests allowed in the window
+    :param window: duration of the window in secs
+    :param lease: number of requests to take from redis at once
+    :param lease_timeout_in_sec: secs a lease can be used for
+    :return: RateLimit
+    """
+    rate_limit = _local_cache('rate_limit').get(key)
+    if rate_limit is not None:
+        return rate_limit
+
+    if lease > 1:
+        stripe = hash(key) % _RATE_LIMIT_LEASE_STRIPES
+        with _rate_limit_lease_locks[stripe]:
+            leases = _rate_limit_leases[stripe]
+            current_lease = leases.get(key)
+
+            if current_lease is not None and current_lease.take():
+                return _leased_rate_limit(current_lease)
+
+            released = current_lease.unused_members() if current_lease is not None else []
+            result = _RATE_LIMIT_SCRIPT(keys=[key], args=[requests, window, lease] + released)
+            granted, remaining, reset, retry_after, lease_id = result
+
+            now = time.time()
+            for lease_key in [lease_key for lease_key, old_lease in leases.items() if old_lease.reset_at < now]:
+                del leases[lease_key]
+            leases.pop(key, None)
+
+            if granted > 1:
+                new_lease = RateLimitLease(lease_id, granted, requests, remaining, reset / 1000000.0,
+                                           lease_timeout_in_sec)
+                new_lease.take()
+
+                # kept past the lease timeout, to hand the unused requests back with the next lease
+                leases[key] = new_lease
+                return _leased_rate_limit(new_lease)
+    else:
+        granted, remaining, reset, retry_after, _ = _RATE_LIMIT_SCRIPT(keys=[key], args=[requests, window, 1])
+
+    reset_in_sec = reset / 1000000.0
+
+    rate_limit = RateLimit(allowed=granted > 0,
+                           limit=requests,
+                           remaining=max(remaining, 0),
+                           reset_in_sec=int(math.ceil(reset_in_sec)),
+                           retry_after_in_sec=int(math.ceil(retry_after / 1000000.0)))
+
+    if not rate_limit.allowed and retry_after > 0:
+        _local_cache('rate_limit').set(key, rate_limit, timeout_in_sec=retry_after / 1000000.0)
+
+    return rate_limit
+
+
+def _leased_rate_limit(lease):
+    return RateLimit(allowed=True,
+                     limit=lease.limit,
+                     remaining=max(lease.remaining, 0) + lease.granted - lease.used,
+                     reset_in_sec=int(math.ceil(max(lease.reset_at - time.time(), 0))),
+                     retry_after_in_sec=0)
+
+
+def lock_user_doc(user_id):
+    """
+    Try to become the only process refilling the cached user doc
+
+    :param user_id:
+    :return: True if the lock was acquired
+    """
+    return _redis_store.set_if_not_exists(USER_DOC_LOCK_KEY.format(user_id=user_id),
+                                          1,
+                                          timeout_in_sec=USER_DOC_LOCK_TIMEOUT_IN_SECS)
+
+
+def unlock_user_doc(user_id):
+    _redis_store.delete(USER_DOC_LOCK_KEY.format(user_id=user_id))
 
 
 def cache_password_reset_key(user, token):
@@ -48,3 +510,179 @@ def validate_password_reset_token(user_id, token):
         return True
 
     return False
+
+
+def cached_matches_exist(user_id):
+    return _redis_store.exists(USER_MATCHES_KEY.format(user_id=user_id))
+
+
+def get_cached_matches(user_id, start, end):
+    """
+    Get a range of the cached matches of a user, most compatible first
+
+    :param user_id:
+    :param start:
+    :param end: inclusive
+    :return: list of (user id, score)
+    """
+    matches = _redis_store.zrevrange(USER_MATCHES_KEY.format(user_id=user_id), start, end, withscores=True)
+    return [(int(match_id), score) for match_id, score in matches if match_id != USER_MATCHES_EMPTY_MEMBER]
+
+
+def replace_cached_matches(user_id, matches):
+    """
+    Replace the cached matches of a user
+
+    :param user_id:
+    :param matches: list of (user id, score), highest score first
+    :return:
+    """
+    key = USER_MATCHES_KEY.format(user_id=user_id)
+    threshold = matches[-1][1] if len(matches) >= USER_MATCHES_TOP_K else 0
+
+    pipe = _redis_store.pipeline()
+    pipe.delete(key)
+    if matches:
+        pipe.zadd(key, **{str(match_id): score for match_id, score in matches})
+    else:
+        pipe.zadd(key, **{USER_MATCHES_EMPTY_MEMBER: USER_MATCHES_EMPTY_SCORE})
+    pipe.zadd(USER_MATCHES_THRESHOLDS_KEY, **{str(user_id): threshold})
+    for match_id, _ in matches:
+        pipe.sadd(USER_MATCHED_BY_KEY.format(user_id=match_id), user_id)
+    pipe.execute()
+
+
+def delete_cached_matches(*user_ids):
+    """
+    Drop the cached matches of users, they are computed again when read
+
+    :param user_ids:
+    :return:
+    """
+    if not user_ids:
+        return
+
+    pipe = _redis_store.pipeline()
+    pipe.delete(*[USER_MATCHES_KEY.format(user_id=user_id) for user_id in user_ids])
+    pipe.zrem(USER_MATCHES_THRESHOLDS_KEY, *user_ids)
+    pipe.execute()
+
+
+def get_cached_matches_affected_by(match_id):
+    """
+    Get the users whose cached matches a change to one user may affect
+
+    :param match_id: user id that changed
+    :return: (dictionary of every user with cached matches to its threshold,
+              set of the users whose cached matches may hold the changed user)
+    """
+    pipe = _redis_store.pipeline(transaction=False)
+    pipe.zrange(USER_MATCHES_THRESHOLDS_KEY, 0, -1, withscores=True, score_cast_func=int)
+    pipe.smembers(USER_MATCHED_BY_KEY.format(user_id=match_id))
+    thresholds, holders = pipe.execute()
+
+    return {int(user_id): threshold for user_id, threshold in thresholds}, {int(user_id) for user_id in holders}
+
+
+def delete_matched_by(match_id):
+    _redis_store.delete(USER_MATCHED_BY_KEY.format(user_id=match_id))
+
+
+def get_scores_in_cached_matches(match_id, user_ids):
+    """
+    Get the score of one user in the cached matches of many users
+
+    Users whose cached matches do not hold it are dropped from its matched by set.
+
+    :param match_id: user id to look up
+    :param user_ids: owners of the cached matches
+    :return: list of scores, None where the user is not in the matches
+    """
+    pipe = _redis_store.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zscore(USER_MATCHES_KEY.format(user_id=user_id), match_id)
+    scores = pipe.execute()
+
+    stale_user_ids = [user_id for user_id, score in zip(user_ids, scores) if score is None]
+    if stale_user_ids:
+        _redis_store.srem(USER_MATCHED_BY_KEY.format(user_id=match_id), *stale_user_ids)
+
+    return scores
+
+
+def add_to_cached_matches(match_id, scores):
+    """
+    Add one user to the cached matches of many users, keeping only the top matches
+
+    Only matches that are cached are patched; the others are computed in full when read.
+
+    :param match_id: user id to add
+    :param scores: dictionary of owner user id to score
+    :return:
+    """
+    if not scores:
+        return
+
+    user_ids = list(scores)
+    _ADD_TO_MATCHES_SCRIPT(keys=[USER_MATCHES_THRESHOLDS_KEY, USER_MATCHED_BY_KEY.format(user_id=match_id)] +
+                                [USER_MATCHES_KEY.format(user_id=user_id) for user_id in user_ids],
+                           args=[match_id, USER_MATCHES_TOP_K, USER_MATCHES_EMPTY_MEMBER] + user_ids +
+                                [scores[user_id] for user_id in user_ids])
+
+
+def get_search_result_key(*args):
+    """
+    Get the cache key of a search result for the current search generation
+
+    :param args: normalized search parameters, e.g. preference dictionaries and page
+    :return: cache key
+    """
+    generation = _redis_store.get(SEARCH_GENERATION_KEY) or 0
+    digest = hashlib.sha1(json.dumps(args, sort_keys=True).encode('UTF-8')).hexdigest()
+    return SEARCH_RESULT_KEY.format(generation=generation, digest=digest)
+
+
+def get_cached_search_result(key):
+    """
+    Get a cached search result
+
+    :param key: key from get_search_result_key()
+    :return: dictionary with the serialized 'result', its 'etag' or None, and 'precompressed',
+             a dictionary of content encoding to the compressed result; None if not cached
+    """
+    cached = _binary_redis_store.hgetall(key)
+
+    if not cached:
+        return None
+
+    precompressed = {field.decode('UTF-8'): value for field, value in cached.items()}
+    result = precompressed.pop('result')
+    etag = precompressed.pop('etag', None)
+
+    return {
+        'result': result,
+        'etag': etag.decode('UTF-8') if etag is not None else None,
+        'precompressed': precompressed
+    }
+
+
+def cache_search_result(key, result, etag=None, precompressed=None, timeout_in_sec=SEARCH_RESULT_TIMEOUT_IN_SECS):
+    """
+    Cache a search result
+
+    :param key: key from get_search_result_key()
+    :param result: serialized result
+    :param etag:
+    :param precompressed: dictionary of content encoding to the compressed result
+    :param timeout_in_sec:
+    :return:
+    """
+    cached = dict(precompressed or {}, result=result)
+    if etag is not None:
+        cached['etag'] = etag
+
+    _binary_redis_store.hmset(key, cached, timeout_in_sec=timeout_in_sec)
+
+
+def invalidate_search_results():
+    _redis_store.incr(SEARCH_GENERATION_KEY, 1)
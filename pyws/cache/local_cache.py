@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# secs to wait before resubscribing after losing the redis connection
+RESUBSCRIBE_DELAY_IN_SECS = 1
+
+
+class LocalCache(object):
+    """
+    Bounded in-process LRU cache whose entries expire after a timeout
+    """
+
+    def __init__(self, max_size, timeout_in_sec):
+        self.max_size = max_size
+        self.timeout_in_sec = timeout_in_sec
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bumped by every delete and clear, see set(..., if_not_deleted_since)
+        self.deletions = 0
+
+    def get(self, key, default=None):
+        """
+        Gets a value from the cache
+
+        :param key:
+        :param default: returned when the key is missing or expired
+        :return:
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[1] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, timeout_in_sec=None, if_not_deleted_since=None):
+        """
+        Sets a key value pair, evicting the least recently used keys when full
+
+        :param key:
+        :param value:
+        :param timeout_in_sec: defaults to the cache timeout
+        :param if_not_deleted_since: `deletions` read before the value was, the value is not stored
+                                     if any key was deleted since, as it may have been invalidated
+        :return:
+        """
+
+        if timeout_in_sec is None:
+            timeout_in_sec = self.timeout_in_sec
+
+        if self.max_size <= 0 or timeout_in_sec <= 0:
+            return
+
+        with self._lock:
+            if if_not_deleted_since is not None and self.deletions != if_not_deleted_since:
+                return
+
+            self._entries[key] = (value, time.time() + timeout_in_sec)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self.deletions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.deletions += 1
+
+    def stats(self):
+        """
+        Gets the size and hit rate of the cache
+
+        :return: dictionary
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class InvalidationSubscriber(object):
+    """
+    Evicts keys from the local caches when any process publishes them on the channel
+
+    Messages are '{family}:{key}'. The listener thread is started lazily, once
+    per process, so that it survives forking servers.
+    """
+
+    def __init__(self, redis_store, channel, caches):
+        self._redis_store = redis_store
+        self._channel = channel
+        self._caches = caches
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            thread = threading.Thread(target=self._listen)
+            thread.daemon = True
+            thread.start()
+            self._pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis_store.pubsub()
+                pubsub.subscribe(self._channel)
+
+                for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+
+                    family, _, key = message['data'].partition(':')
+                    if family in self._caches:
+                        self._caches[family].delete(key)
+
+            except Exception:
+                # messages may have been missed while disconnected, and the thread
+                # must outlive any error since it is never started again in this process
+                for cache in self._caches.values():
+                    cache.clear()
+                time.sleep(RESUBSCRIBE_DELAY_IN_SECS)
+
+
+class RateLimitLease(object):
+    """
+    Requests taken at once from a redis rate limit, handed out by this process
+    """
+
+    def __init__(self, lease_id, granted, limit, remaining, reset_in_sec, timeout_in_sec):
+        self.lease_id = lease_id
+        self.granted = granted
+        self.used = 0
+        self.limit = limit
+        # requests left in redis once this lease was taken
+        self.remaining = remaining
+        self.reset_at = time.time() + reset_in_sec
+        self.expires_at = time.time() + timeout_in_sec
+
+    def take(self):
+        """
+        Take one of the leased requests
+
+        :return: False if they ran out or the lease timed out
+        """
+
+        if self.used >= self.granted or self.expires_at < time.time():
+            return False
+
+        self.used += 1
+        return True
+
+    def unused_members(self):
+        """
+        Get the sorted set members that stand for the leased requests that were not used
+
+        :return: list of members
+        """
+
+        return [u'{0}:{1}'.format(self.lease_id, i) for i in range(self.used, self.granted)]
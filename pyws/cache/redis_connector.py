@@ -1,16 +1,213 @@
+import threading
+import time
+
 import redis
+from redis.client import StrictPipeline
+from redis.exceptions import ConnectionError, TimeoutError
 from config import Config
 
 from pyws.cache.cache_constants import DEFAULT_TIMEOUT_IN_SECS
 
+# options of the clients in the registry, on top of the ones from Config
+_CLIENT_OPTIONS = {
+    'default': {'decode_responses': True},
+    # for values kept as encoded bytes, e.g. serialized json
+    'binary': {'decode_responses': False},
+    # subscribers wait on reads until a message is published, so they have no read timeout
+    'pubsub': {'decode_responses': True, 'socket_timeout': None}
+}
 
-class RedisStore(object):
+
+class RedisMetrics(object):
+    """
+    Latency of every redis command and how often the connection pools ran out, for this process
+    """
 
     def __init__(self):
-        self.conn = redis.StrictRedis(host=Config.REDIS_HOST,
+        self._lock = threading.Lock()
+        self._commands = {}
+        self.pool_waits = 0
+        self.pool_timeouts = 0
+
+    def record_command(self, command_name, elapsed_in_sec, failed):
+        with self._lock:
+            command = self._commands.get(command_name)
+            if command is None:
+                command = self._commands[command_name] = {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0}
+
+            command['count'] += 1
+            command['total'] += elapsed_in_sec
+            command['max'] = max(command['max'], elapsed_in_sec)
+            if failed:
+                command['errors'] += 1
+
+    def record_pool_wait(self):
+        with self._lock:
+            self.pool_waits += 1
+
+    def record_pool_timeout(self):
+        with self._lock:
+            self.pool_timeouts += 1
+
+    def stats(self):
+        """
+        Gets the latency of every command and the pool exhaustion counts
+
+        :return: dictionary
+        """
+
+        with self._lock:
+            commands = {name: {'count': command['count'],
+                               'errors': command['errors'],
+                               'mean_ms': command['total'] * 1000 / command['count'],
+                               'max_ms': command['max'] * 1000}
+                        for name, command in self._commands.items()}
+
+            return {
+                'commands': commands,
+                # a command found every connection in use and had to wait
+                'pool_waits': self.pool_waits,
+                # ... and none was released within REDIS_POOL_TIMEOUT_IN_SECS
+                'pool_timeouts': self.pool_timeouts
+            }
+
+
+_metrics = RedisMetrics()
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Connection pool that waits for a free connection when all are in use, counts those waits,
+    and pings connections that sat idle before handing them out
+    """
+
+    def __init__(self, health_check_interval_in_sec=None, **kwargs):
+        self.health_check_interval_in_sec = health_check_interval_in_sec
+        super(InstrumentedConnectionPool, self).__init__(**kwargs)
+
+    def get_connection(self, command_name, *keys, **options):
+        if self.pool.empty():
+            _metrics.record_pool_wait()
+
+        try:
+            connection = super(InstrumentedConnectionPool, self).get_connection(command_name, *keys, **options)
+        except ConnectionError:
+            # the only error of the blocking pool, raised when no connection was released in time
+            _metrics.record_pool_timeout()
+            raise
+
+        self._check_health(connection)
+        return connection
+
+    def release(self, connection):
+        connection.last_used_at = time.time()
+        super(InstrumentedConnectionPool, self).release(connection)
+
+    def _check_health(self, connection):
+        if self.health_check_interval_in_sec is None:
+            return
+
+        last_used_at = getattr(connection, 'last_used_at', None)
+        if last_used_at is None or time.time() - last_used_at < self.health_check_interval_in_sec:
+            return
+
+        try:
+            connection.send_command('PING')
+            connection.read_response()
+        except (ConnectionError, TimeoutError):
+            # reconnected on the next command
+            connection.disconnect()
+
+
+class InstrumentedPipeline(StrictPipeline):
+    """
+    Pipeline whose round trip is timed as one 'PIPELINE' command
+    """
+
+    def execute(self, raise_on_error=True):
+        start = time.time()
+        failed = True
+        try:
+            result = super(InstrumentedPipeline, self).execute(raise_on_error=raise_on_error)
+            failed = False
+            return result
+        finally:
+            _metrics.record_command('PIPELINE', time.time() - start, failed)
+
+
+class InstrumentedRedis(redis.StrictRedis):
+    """
+    Redis client that times every command
+    """
+
+    def execute_command(self, *args, **options):
+        start = time.time()
+        failed = True
+        try:
+            result = super(InstrumentedRedis, self).execute_command(*args, **options)
+            failed = False
+            return result
+        finally:
+            _metrics.record_command(args[0], time.time() - start, failed)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name='default'):
+    """
+    Get a redis client shared by the whole process, creating it on first use
+
+    Every client has its own pool of at most REDIS_MAX_CONNECTIONS connections.
+
+    :param name: one of 'default', 'binary' or 'pubsub'
+    :return: client
+    """
+
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = _create_client(**_CLIENT_OPTIONS[name])
+
+    return client
+
+
+def _create_client(decode_responses, socket_timeout=Config.REDIS_SOCKET_TIMEOUT_IN_SECS):
+    pool = InstrumentedConnectionPool(host=Config.REDIS_HOST,
                                       port=Config.REDIS_PORT,
                                       db=Config.REDIS_DB,
-                                      decode_responses=True)
+                                      decode_responses=decode_responses,
+                                      max_connections=Config.REDIS_MAX_CONNECTIONS,
+                                      timeout=Config.REDIS_POOL_TIMEOUT_IN_SECS,
+                                      socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT_IN_SECS,
+                                      socket_timeout=socket_timeout,
+                                      retry_on_timeout=Config.REDIS_RETRY_ON_TIMEOUT,
+                                      health_check_interval_in_sec=Config.REDIS_HEALTH_CHECK_INTERVAL_IN_SECS)
+    return InstrumentedRedis(connection_pool=pool)
+
+
+def get_redis_stats():
+    """
+    Get the latency of every redis command and the pool exhaustion counts of this process
+
+    :return: dictionary
+    """
+    return _metrics.stats()
+
+
+class RedisStore(object):
+
+    def __init__(self, decode_responses=True):
+        """
+        :param decode_responses: False to get values back as the bytes that were stored
+        """
+        self.conn = get_client('default' if decode_responses else 'binary')
 
     def hmset(self, key, hash_dict, timeout_in_sec=DEFAULT_TIMEOUT_IN_SECS):
         """
@@ -61,6 +258,17 @@ class RedisStore(object):
         else:
             self.conn.setex(key, timeout_in_sec, value)
 
+    def set_if_not_exists(self, key, value, timeout_in_sec=DEFAULT_TIMEOUT_IN_SECS):
+        """
+        Sets a key value pair only if the key does not exist yet
+
+        :param key:
+        :param value:
+        :param timeout_in_sec:
+        :return: True if the key was set
+        """
+        return bool(self.conn.set(key, value, ex=timeout_in_sec, nx=True))
+
     def get(self, key):
         """
         Gets a value from the cache
@@ -70,6 +278,38 @@ class RedisStore(object):
         """
         return self.conn.get(key)
 
+    def mget(self, keys):
+        """
+        Gets the values of many keys in one round trip
+
+        :param keys: list of keys
+        :return: list of stored values, None for missing keys
+        """
+        if not keys:
+            return []
+        return self.conn.mget(keys)
+
+    def mset(self, mapping, timeout_in_sec=DEFAULT_TIMEOUT_IN_SECS):
+        """
+        Sets many key value pairs in one round trip
+
+        :param mapping: dictionary of key to value
+        :param timeout_in_sec:
+        :return:
+        """
+        if not mapping:
+            return
+
+        if timeout_in_sec is None:
+            # permanent keys
+            self.conn.mset(mapping)
+            return
+
+        pipe = self.conn.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.setex(key, timeout_in_sec, value)
+        pipe.execute()
+
     def expire(self, key, timeout_in_sec=0):
         """
         Changes the expiration time of a key
@@ -85,9 +325,9 @@ class RedisStore(object):
         Gets time-to-live for a key
 
         :param key:
-        :return:
+        :return: secs to live, -2 if the key does not exist, -1 if it does not expire
         """
-        self.conn.ttl(key)
+        return self.conn.ttl(key)
 
     def incr(self, key, num):
         """
@@ -95,9 +335,9 @@ class RedisStore(object):
 
         :param key:
         :param num:
-        :return:
+        :return: value after the increment
         """
-        self.conn.incr(key, num)
+        return self.conn.incr(key, num)
 
     def exists(self, key):
         """
@@ -107,3 +347,70 @@ class RedisStore(object):
         :return:
         """
         return self.conn.exists(key)
+
+    def delete(self, *keys):
+        """
+        Deletes the keys
+
+        :param keys:
+        :return: number of keys deleted
+        """
+        return self.conn.delete(*keys)
+
+    def srem(self, key, *members):
+        """
+        Removes members from a set
+
+        :param key:
+        :param members:
+        :return: number of members removed
+        """
+        return self.conn.srem(key, *members)
+
+    def zrevrange(self, key, start, end, withscores=False):
+        """
+        Gets a range of members of a sorted set, highest score first
+
+        :param key:
+        :param start:
+        :param end: inclusive
+        :param withscores:
+        :return: list of members or (member, score) tuples
+        """
+        return self.conn.zrevrange(key, start, end, withscores=withscores, score_cast_func=int)
+
+    def pipeline(self, transaction=True):
+        """
+        Gets a pipeline that sends the queued commands in one round trip
+
+        :param transaction: wrap the commands in MULTI/EXEC
+        :return: pipeline
+        """
+        return self.conn.pipeline(transaction=transaction)
+
+    def register_script(self, script):
+        """
+        Registers a lua script, run with EVALSHA and loaded into redis on first use
+
+        :param script: lua source
+        :return: callable taking keys and args
+        """
+        return self.conn.register_script(script)
+
+    def publish(self, channel, message):
+        """
+        Publishes a message on a channel
+
+        :param channel:
+        :param message:
+        :return: number of subscribers that received the message
+        """
+        return self.conn.publish(channel, message)
+
+    def pubsub(self):
+        """
+        Gets a pubsub object to subscribe to channels with
+
+        :return: pubsub
+        """
+        return get_client('pubsub').pubsub(ignore_subscribe_messages=True)
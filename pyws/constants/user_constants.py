@@ -7,4 +7,7 @@ AGE_GROUPS = {
                 '40-45': [40, 41, 42, 43, 44, 45],
                 '45-50': [45, 46, 47, 48, 49, 50],
                 '50-60': [50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60]
-             }
\ No newline at end of file
+             }
+
+# postgres text search configuration used for the user descriptions
+SEARCH_TEXT_CONFIG = 'pg_catalog.english'
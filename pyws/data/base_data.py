@@ -15,6 +15,19 @@ class BaseData(object):
 
         return db.session.query(self.model_class).get(id)
 
+    def get_many(self, ids):
+        """
+        Get the models of many ids with one query
+
+        :param ids: list of primary keys
+        :return: list of models, in no particular order, without the ids that do not exist
+        """
+
+        if not ids:
+            return []
+
+        return db.session.query(self.model_class).filter(self.model_class.id.in_(ids)).all()
+
     def create(self, model):
         """
         Create the new model
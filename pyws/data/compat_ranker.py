@@ -0,0 +1,159 @@
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from pyws.constants.user_constants import AGE_GROUPS
+from pyws.data.match_index import NULL_CODE, bitmap_to_mask
+
+# highest possible compatibility score
+MAX_SCORE = 100
+
+# match index columns needed to score a candidate
+SCORE_COLUMNS = ['gender',
+                 'education',
+                 'birth_year',
+                 'preference_gender',
+                 'preference_education',
+                 'preference_age_group',
+                 'budget_min',
+                 'budget_max',
+                 'household_size']
+
+RankedPage = namedtuple('RankedPage', ['items', 'has_next'])
+
+
+def score(match_index, columns, user_id):
+    """
+    Score the mutual compatibility between a user and every user slot of the match index
+
+    Each side gets the fraction of its preferences the other side satisfies,
+    shared preferences (budget and household size) count for both sides.
+    The score is the geometric mean of both fractions scaled to MAX_SCORE,
+    so a candidate that fails either side completely scores 0.
+
+    :param match_index:
+    :param columns: snapshot of the SCORE_COLUMNS from the match index
+    :param user_id: id of the searching user
+    :return: numpy array of scores indexed by user id
+    """
+
+    c = {name: np.frombuffer(codes, dtype=codes.typecode) for name, codes in columns.items()}
+    s = {name: int(values[user_id]) for name, values in c.items()}
+    size = len(c['gender'])
+
+    forward = []
+    reverse = []
+
+    # the searcher's individual preferences against the candidate's profile
+    for column in ['gender', 'education']:
+        wanted = s['preference_' + column]
+        if wanted != NULL_CODE:
+            forward.append((True, c[column] == wanted))
+
+    if s['preference_age_group'] != NULL_CODE:
+        min_birth_year, max_birth_year = _birth_year_range(match_index, s['preference_age_group'])
+        forward.append((True, (c['birth_year'] >= min_birth_year) & (c['birth_year'] <= max_birth_year)))
+
+    # the candidate's individual preferences against the searcher's profile
+    for column in ['gender', 'education']:
+        wanted = c['preference_' + column]
+        reverse.append((wanted != NULL_CODE, wanted == s[column]))
+
+    age_group_codes = c['preference_age_group']
+    has_age_group = age_group_codes != NULL_CODE
+    searcher_in_age_group = np.array([_in_age_group(match_index, code, s['birth_year'])
+                                      for code in range(len(match_index.columns['preference_age_group'].enums))])
+    reverse.append((has_age_group, searcher_in_age_group[np.where(has_age_group, age_group_codes, 0)]))
+
+    # shared preferences, missing bounds are unbounded
+    candidate_min = np.where(c['budget_min'] == NULL_CODE, np.iinfo(np.int64).min, c['budget_min'])
+    candidate_max = np.where(c['budget_max'] == NULL_CODE, np.iinfo(np.int64).max, c['budget_max'])
+    searcher_min = s['budget_min'] if s['budget_min'] != NULL_CODE else np.iinfo(np.int64).min
+    searcher_max = s['budget_max'] if s['budget_max'] != NULL_CODE else np.iinfo(np.int64).max
+    has_budget = (c['budget_min'] != NULL_CODE) | (c['budget_max'] != NULL_CODE) | \
+                 (s['budget_min'] != NULL_CODE) | (s['budget_max'] != NULL_CODE)
+    budget = (has_budget, (candidate_min <= searcher_max) & (candidate_max >= searcher_min))
+
+    household_size = ((c['household_size'] != NULL_CODE) & (s['household_size'] != NULL_CODE),
+                      c['household_size'] == s['household_size'])
+
+    forward.extend([budget, household_size])
+    reverse.extend([budget, household_size])
+
+    ratio = _satisfied_ratio(forward, size) * _satisfied_ratio(reverse, size)
+    return np.rint(MAX_SCORE * np.sqrt(ratio)).astype(np.int64)
+
+
+def rank(match_index, user_id, bitmap, page, per_page, last_key=None):
+    """
+    Rank the users in the bitmap by compatibility with the given user
+
+    Results are ordered by score descending, then by user id.
+
+    :param match_index:
+    :param user_id: id of the searching user
+    :param bitmap: bitmap of the qualified users
+    :param page: 1 based page number, ignored when last_key is given
+    :param per_page:
+    :param last_key: [score, user id] of the last user of the previous page
+    :return: RankedPage of [(user id, score)]
+    """
+
+    columns = match_index.snapshot(SCORE_COLUMNS)
+    size = len(columns['gender'])
+
+    if user_id >= size or not match_index.users >> user_id & 1:
+        raise Exception(u'Invalid user id.')
+
+    scores = score(match_index, columns, user_id)
+    ids = np.arange(size, dtype=np.int64)
+
+    candidates = bitmap_to_mask(bitmap, size) & (scores > 0)
+    candidates[user_id] = False
+
+    skip = max(page - 1, 0) * per_page
+    if last_key is not None:
+        last_score, last_id = last_key
+        candidates &= (scores < last_score) | ((scores == last_score) & (ids > last_id))
+        skip = 0
+
+    # a single sort key: higher scores first, then lower ids
+    candidate_ids = ids[candidates]
+    keys = (MAX_SCORE - scores[candidate_ids]) * size + candidate_ids
+
+    wanted = skip + per_page + 1
+    if len(keys) > wanted:
+        keys = keys[np.argpartition(keys, wanted - 1)[:wanted]]
+    keys = np.sort(keys)[skip:]
+
+    top = [(int(key % size), int(MAX_SCORE - key // size)) for key in keys]
+
+    return RankedPage(top[:per_page], len(top) > per_page)
+
+
+def _satisfied_ratio(checks, size):
+    considered = np.zeros(size)
+    satisfied = np.zeros(size)
+
+    for is_considered, is_satisfied in checks:
+        considered += is_considered
+        satisfied += is_considered & is_satisfied
+
+    # nothing to satisfy is a perfect match
+    return np.where(considered > 0, satisfied / np.maximum(considered, 1), 1.0)
+
+
+def _birth_year_range(match_index, age_group_code):
+    ages = AGE_GROUPS[match_index.columns['preference_age_group'].enums[age_group_code]]
+    current_year = datetime.utcnow().year
+    return current_year - max(ages), current_year - min(ages)
+
+
+def _in_age_group(match_index, age_group_code, birth_year):
+    if birth_year == NULL_CODE:
+        return False
+
+    min_birth_year, max_birth_year = _birth_year_range(match_index, age_group_code)
+    return min_birth_year <= birth_year <= max_birth_year
+
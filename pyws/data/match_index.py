@@ -0,0 +1,412 @@
+import threading
+import time
+from array import array
+
+import numpy as np
+
+# code stored for a missing (NULL) value
+NULL_CODE = -(2 ** 31)
+
+
+class IndexColumn(object):
+    """
+    An integer-coded column plus one bitmap per distinct value
+
+    Bit n of a bitmap is set when the user with id n holds that value.
+    Enum columns are coded by the position of the value in `enums`,
+    integer columns are stored as they are.
+    """
+
+    def __init__(self, name, enums=None):
+        self.name = name
+        self.enums = list(enums) if enums is not None else None
+        self.codes = array('l')
+        self.bitmaps = {}
+
+    def encode(self, value):
+        """
+        Get the integer code of a value
+
+        :param value: raw value, e.g. 'M' or '1200'
+        :return: code, NULL_CODE for None, or None if the value can never match
+        """
+
+        if value is None:
+            return NULL_CODE
+
+        try:
+            if self.enums is not None:
+                return self.enums.index(value)
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+
+    def set(self, user_id, value):
+        """
+        Set the value of a user, moving its bit to the new value's bitmap
+
+        :param user_id:
+        :param value:
+        :return:
+        """
+
+        if len(self.codes) <= user_id:
+            self.codes.extend([NULL_CODE] * (user_id + 1 - len(self.codes)))
+
+        code = self.encode(value)
+        if code is None:
+            code = NULL_CODE
+
+        old_code = self.codes[user_id]
+        if old_code == code:
+            return
+
+        bit = 1 << user_id
+        if old_code != NULL_CODE:
+            remaining = self.bitmaps[old_code] ^ bit
+            if remaining:
+                self.bitmaps[old_code] = remaining
+            else:
+                del self.bitmaps[old_code]
+
+        if code != NULL_CODE:
+            self.bitmaps[code] = self.bitmaps.get(code, 0) | bit
+
+        self.codes[user_id] = code
+
+    def load(self, user_values):
+        """
+        Fill an empty column, building every bitmap once
+
+        :param user_values: list of (user id, value)
+        :return:
+        """
+
+        size = max(user_id for user_id, _ in user_values) + 1 if user_values else 0
+        self.codes = array('l', [NULL_CODE]) * size
+
+        ids_by_code = {}
+        for user_id, value in user_values:
+            code = self.encode(value)
+            if code is None or code == NULL_CODE:
+                continue
+
+            self.codes[user_id] = code
+            ids_by_code.setdefault(code, []).append(user_id)
+
+        self.bitmaps = {code: MatchIndex.bitmap_from_ids(user_ids) for code, user_ids in ids_by_code.items()}
+
+    def bitmap(self, value):
+        """
+        Get the bitmap of users holding the value
+
+        :param value:
+        :return: bitmap
+        """
+
+        code = self.encode(value)
+        if code is None or code == NULL_CODE:
+            return 0
+        return self.bitmaps.get(code, 0)
+
+
+class MatchIndex(object):
+    """
+    In-process bitmap index over the user search attributes
+
+    Preference filters are answered with bitmap AND operations, so the
+    database only needs to load the page of users that matched.
+    """
+
+    def __init__(self, columns):
+        """
+        :param columns: dictionary of column name to enum values (None for integer columns)
+        """
+
+        self._column_defs = columns
+        self._lock = threading.RLock()
+        # only one caller rebuilds at a time
+        self._load_lock = threading.Lock()
+        # users written while a rebuild runs, applied to the rebuilt index before it is swapped in
+        self._writes = None
+        # columns and users bitmap, always replaced together by a single assignment
+        self._state = ({name: IndexColumn(name, enums) for name, enums in columns.items()}, 0)
+        self.loaded_time = None
+
+    @property
+    def columns(self):
+        return self._state[0]
+
+    @property
+    def users(self):
+        return self._state[1]
+
+    @property
+    def loaded(self):
+        return self.loaded_time is not None
+
+    def is_stale(self, max_age_in_sec):
+        return not self.loaded or time.time() - self.loaded_time > max_age_in_sec
+
+    def refresh(self, load_records, max_age_in_sec):
+        """
+        Rebuild the index when it is missing or stale
+
+        Only one caller rebuilds. While it does, the others keep using the current index,
+        unless there is none yet, in which case they wait for it.
+
+        :param load_records: function returning an iterable of (user id, dictionary of column values)
+        :param max_age_in_sec:
+        :return:
+        """
+
+        if not self.is_stale(max_age_in_sec):
+            return
+
+        if not self._load_lock.acquire(not self.loaded):
+            return
+
+        try:
+            # rebuilt by another caller while this one waited
+            if self.is_stale(max_age_in_sec):
+                self.load(load_records())
+        finally:
+            self._load_lock.release()
+
+    def load(self, records):
+        """
+        Rebuild the index from scratch
+
+        The new index is built aside and swapped in at the end, so readers never see it half built.
+
+        :param records: iterable of (user id, dictionary of column values)
+        :return:
+        """
+
+        with self._lock:
+            self._writes = {}
+
+        try:
+            records = list(records)
+
+            columns = {}
+            for name, enums in self._column_defs.items():
+                column = IndexColumn(name, enums)
+                column.load([(user_id, values.get(name)) for user_id, values in records])
+                columns[name] = column
+
+            users = self.bitmap_from_ids(user_id for user_id, _ in records)
+
+            with self._lock:
+                # the records may have been read before these writes
+                for user_id, values in self._writes.items():
+                    if values is None:
+                        users = self._remove_from(columns, users, user_id)
+                    else:
+                        users = self._set_in(columns, users, user_id, values)
+
+                self._state = (columns, users)
+                self.loaded_time = time.time()
+        finally:
+            with self._lock:
+                self._writes = None
+
+    def set(self, user_id, values):
+        """
+        Add or refresh a single user
+
+        :param user_id:
+        :param values: dictionary of column values
+        :return:
+        """
+
+        with self._lock:
+            columns, users = self._state
+            self._state = (columns, self._set_in(columns, users, user_id, values))
+            if self._writes is not None:
+                self._writes[user_id] = values
+
+    def remove(self, user_id):
+        """
+        Remove a user from the index
+
+        :param user_id:
+        :return:
+        """
+
+        with self._lock:
+            columns, users = self._state
+            self._state = (columns, self._remove_from(columns, users, user_id))
+            if self._writes is not None:
+                self._writes[user_id] = None
+
+    @staticmethod
+    def _set_in(columns, users, user_id, values):
+        for name, column in columns.items():
+            column.set(user_id, values.get(name))
+        return users | 1 << user_id
+
+    @staticmethod
+    def _remove_from(columns, users, user_id):
+        if not users >> user_id & 1:
+            return users
+
+        for column in columns.values():
+            column.set(user_id, None)
+        return users ^ 1 << user_id
+
+    def snapshot(self, names):
+        """
+        Get a consistent copy of the integer-coded columns
+
+        :param names: list of column names
+        :return: dictionary of column name to array of codes indexed by user id
+        """
+
+        with self._lock:
+            return {name: self.columns[name].codes[:] for name in names}
+
+    def bitmap(self, column, values):
+        """
+        Get the bitmap of users holding any of the values
+
+        :param column: column name
+        :param values: list of values
+        :return: bitmap
+        """
+
+        result = 0
+        for value in values:
+            result |= self.columns[column].bitmap(value)
+        return result
+
+    def overlap(self, min_column, max_column, low, high):
+        """
+        Get the bitmap of users whose [min, max] range overlaps [low, high]
+
+        Missing bounds on either side are unbounded.
+
+        :param min_column: column holding the lower bounds
+        :param max_column: column holding the upper bounds
+        :param low: lower bound or None
+        :param high: upper bound or None
+        :return: bitmap
+        """
+
+        columns = self.snapshot([min_column, max_column])
+        mins = np.frombuffer(columns[min_column], dtype=columns[min_column].typecode)
+        maxs = np.frombuffer(columns[max_column], dtype=columns[max_column].typecode)
+
+        mask = np.ones(len(mins), dtype=bool)
+        if high is not None:
+            # NULL_CODE is below every bound, so missing lower bounds pass
+            mask &= mins <= high
+        if low is not None:
+            mask &= (maxs >= low) | (maxs == NULL_CODE)
+
+        return mask_to_bitmap(mask) & self.users
+
+    def between(self, column, low, high):
+        """
+        Get the bitmap of users whose value is within [low, high]
+
+        :param column:
+        :param low: lower bound or None
+        :param high: upper bound or None
+        :return: bitmap
+        """
+
+        codes = self.snapshot([column])[column]
+        values = np.frombuffer(codes, dtype=codes.typecode)
+
+        mask = values != NULL_CODE
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+
+        return mask_to_bitmap(mask) & self.users
+
+    @staticmethod
+    def iter_ids(bitmap):
+        """
+        Iterate over the user ids set in the bitmap in ascending order
+
+        :param bitmap:
+        :return: generator of user ids
+        """
+
+        while bitmap:
+            lowest = bitmap & -bitmap
+            yield lowest.bit_length() - 1
+            bitmap ^= lowest
+
+    @staticmethod
+    def bitmap_from_ids(user_ids):
+        """
+        Build a bitmap from user ids
+
+        :param user_ids: iterable of user ids
+        :return: bitmap
+        """
+
+        bits = bytearray()
+        for user_id in user_ids:
+            byte = user_id >> 3
+            if len(bits) <= byte:
+                bits.extend(bytes(byte + 1 - len(bits)))
+            bits[byte] |= 1 << (user_id & 7)
+        return int.from_bytes(bytes(bits), 'little')
+
+    @staticmethod
+    def count(bitmap):
+        return bin(bitmap).count('1')
+
+    def page(self, bitmap, page, per_page):
+        """
+        Get one page of user ids from the bitmap
+
+        :param bitmap:
+        :param page: 1 based page number
+        :param per_page:
+        :return: list of user ids
+        """
+
+        skip = max(page - 1, 0) * per_page
+        user_ids = []
+
+        for user_id in self.iter_ids(bitmap):
+            if skip:
+                skip -= 1
+                continue
+
+            user_ids.append(user_id)
+            if len(user_ids) == per_page:
+                break
+
+        return user_ids
+
+
+def bitmap_to_mask(bitmap, size):
+    """
+    Unpack a bitmap into a numpy boolean array indexed by user id
+
+    :param bitmap:
+    :param size: length of the array
+    :return: numpy array
+    """
+
+    bitmap &= (1 << size) - 1
+    raw = np.frombuffer(bitmap.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little')[:size].astype(bool)
+
+
+def mask_to_bitmap(mask):
+    """
+    Pack a numpy boolean array indexed by user id into a bitmap
+
+    :param mask: numpy array
+    :return: bitmap
+    """
+
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
@@ -1,38 +1,73 @@
-from datetime import datetime
+# compiled serializers by (model class, filter_hidden_columns)
+_serializers = {}
 
 
 class BaseModel(object):
 
-    def to_json(self, filter_hidden_columns=False):
+    def to_json(self, filter_hidden_columns=False, fields=None):
         """
         Transform the model into a json object
 
+        Datetimes are left as they are, json_helper encodes them.
+
+        :param filter_hidden_columns:
+        :param fields: column and relationship names to include, None for all
         :return: jsonified model
         """
 
-        self.id # important: need to access id first to populate
-
-        jsonified_obj = {}
-        for key in self.__table__.columns.keys():
-            if isinstance(getattr(self, key), datetime):
-                jsonified_obj[key] = getattr(self, key).isoformat()
-            else:
-                jsonified_obj[key] = getattr(self, key)
-
-        if '_relationships' in dir(self):
-            for key in self.relationships().keys():
-                if getattr(self, key):
-                    if isinstance(getattr(self, key), list):
-                        jsonified_obj[key] = []
-                        for model in getattr(self, key):
-                            jsonified_obj[key].append(self.to_json(model, filter_hidden_columns))
+        serializer = _serializers.get((type(self), filter_hidden_columns))
+        if serializer is None:
+            serializer = type(self).compile_serializer(filter_hidden_columns)
+            _serializers[(type(self), filter_hidden_columns)] = serializer
+
+        return serializer(self, fields)
+
+    @classmethod
+    def compile_serializer(cls, filter_hidden_columns=False):
+        """
+        Build a function that serializes models of this class in a single pass
+
+        The visible columns and the relationships are worked out once here
+        instead of on every to_json() call.
+
+        :param filter_hidden_columns:
+        :return: function taking a model and the fields to include, and returning its jsonified dictionary
+        """
+
+        hidden_columns = set()
+        if filter_hidden_columns and hasattr(cls, '_hidden_columns'):
+            hidden_columns = set(cls.hidden_columns())
+
+        columns = [column.key
+                   for column in cls.__table__.columns
+                   if column.key not in hidden_columns]
+
+        relationships = []
+        if hasattr(cls, '_relationships'):
+            relationships = list(cls.relationships().keys())
+
+        def serialize(model, fields=None):
+            model.id # important: need to access id first to populate
+
+            values = model.__dict__
+
+            jsonified_obj = {}
+            for key in columns:
+                # deferred columns are left out unless they were loaded
+                if key in values and (fields is None or key in fields):
+                    jsonified_obj[key] = values[key]
+
+            for key in relationships:
+                if fields is not None and key not in fields:
+                    continue
+
+                related = getattr(model, key)
+                if related:
+                    if isinstance(related, list):
+                        jsonified_obj[key] = [each.to_json(filter_hidden_columns) for each in related]
                     else:
-                        jsonified_obj[key] = getattr(self, key).to_json(filter_hidden_columns)
+                        jsonified_obj[key] = related.to_json(filter_hidden_columns)
 
-        if '_hidden_columns' in dir(self):
-            if filter_hidden_columns:
-                hidden_columns = self.hidden_columns()
-                for hidden_column in hidden_columns:
-                    del jsonified_obj[hidden_column]
+            return jsonified_obj
 
-        return jsonified_obj
+        return serialize
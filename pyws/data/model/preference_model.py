@@ -29,9 +29,16 @@ class PreferenceModel(db.Model, BaseModel):
     # preference shared by both parties
     _shared_preference_columns = ['budget_max', 'budget_min', 'household_size']
 
+    # range filters on the shared preference columns
+    _shared_preference_range_filters = ['household_size_min', 'household_size_max']
+
     # hidden_columns
     _hidden_columns = ['user_id']
 
+    __table_args__ = (db.CheckConstraint('budget_min IS NULL OR budget_max IS NULL OR budget_min <= budget_max',
+                                         name='ck_preference_budget_range'),
+                      db.Index('ix_preference_household_size', 'household_size'))
+
     def __init__(self, obj=None):
         db.Model.__init__(self, **obj)
 
@@ -43,9 +50,19 @@ class PreferenceModel(db.Model, BaseModel):
     def shared_preference_columns(cls):
         return cls._shared_preference_columns
 
+    @classmethod
+    def shared_preference_range_filters(cls):
+        return cls._shared_preference_range_filters
+
     @classmethod
     def hidden_columns(cls):
         return cls._hidden_columns
 
     def __repr__(self):
         return '<id: {0}>'.format(self.id)
+
+
+# budget range overlap (&&) lookups
+db.Index('ix_preference_budget_range',
+         db.func.int4range(PreferenceModel.budget_min, PreferenceModel.budget_max, '[]'),
+         postgresql_using='gist')
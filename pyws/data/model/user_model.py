@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy_utils import EncryptedType
 
 from config import Config
@@ -9,6 +10,7 @@ from pyws.data.model.preference_model import PreferenceModel
 class UserModel(db.Model, BaseModel):
 
     __tablename__ = 'user'
+    __table_args__ = (db.Index('ix_user_search_vector', 'search_vector', postgresql_using='gin'),)
 
     id = db.Column(db.Integer, primary_key=True)
     user_name = db.Column(db.Unicode(64), index=True, unique=True, nullable=False)
@@ -19,12 +21,18 @@ class UserModel(db.Model, BaseModel):
     long_description = db.Column(db.UnicodeText)
     education = db.Column(db.Enum('H', 'C', 'G', 'B', name='education_enum'))
     age = db.Column(db.Integer)
+    # estimated from age and age_last_modified, so age filters can use an index
+    birth_year = db.Column(db.Integer, index=True)
     created_time = db.Column(db.DateTime, default=datetime.utcnow)
     age_last_modified = db.Column(db.DateTime, default=datetime.utcnow)
     deleted = db.Column(db.Boolean, unique=False, nullable=False, default=False)
     last_deleted_time = db.Column(db.DateTime)
     password = db.Column(EncryptedType(db.Unicode(64), Config.SECRET_KEY), nullable=False)
     profile_photo = db.Column(db.Unicode(140))
+    # full text of short_description and long_description, maintained by a db trigger
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    # bumped on every write to the user or its preference
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     preference = db.relationship(PreferenceModel,
                                  backref='user',
                                  cascade='all, delete-orphan',
@@ -35,8 +43,11 @@ class UserModel(db.Model, BaseModel):
     _private_columns = ['id',
                         'created_time',
                         'age_last_modified',
+                        'birth_year',
                         'profile_photo',
-                        'last_deleted_time']
+                        'last_deleted_time',
+                        'search_vector',
+                        'version']
 
     # columns that should not be return in the api
     _hidden_columns = ['password']
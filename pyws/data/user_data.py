@@ -1,20 +1,52 @@
-from flask import g
 from datetime import datetime
+from sqlalchemy.orm import load_only, noload
 
 from pyws.data.base_data import db
 from pyws.data.base_data import BaseData
 from pyws.data.model.user_model import UserModel
 from pyws.data.model.preference_model import PreferenceModel
+from pyws.data.match_index import MatchIndex
+from pyws.data import compat_ranker
 from pyws.cache import cache_helper
-from pyws.constants.user_constants import AGE_GROUPS
+from pyws.helper import string_helper
+from pyws.constants.user_constants import AGE_GROUPS, SEARCH_TEXT_CONFIG
 from config import Config
 
+_match_index = MatchIndex({
+    'gender': UserModel.__table__.columns['gender'].type.enums,
+    'education': UserModel.__table__.columns['education'].type.enums,
+    'birth_year': None,
+    'preference_gender': PreferenceModel.__table__.columns['gender'].type.enums,
+    'preference_education': PreferenceModel.__table__.columns['education'].type.enums,
+    'preference_age_group': PreferenceModel.__table__.columns['age_group'].type.enums,
+    'has_preference': None,
+    'budget_max': None,
+    'budget_min': None,
+    'household_size': None
+})
+
 
 class UserData(BaseData):
 
     def __init__(self):
         self.model_class = UserModel
 
+    def create(self, user):
+        """
+        Create a new user
+
+        :param user: user model
+        :return: newly created user model
+        """
+
+        user.birth_year = self._birth_year(user.age)
+
+        super(UserData, self).create(user)
+        self._refresh_match_index(user)
+        self._invalidate_caches(user.id, user.version)
+
+        return user
+
     def update(self, user, info):
         """
         Update a user with the given info
@@ -30,12 +62,17 @@ class UserData(BaseData):
 
                 if key == 'age':
                     setattr(user, 'age_last_modified', datetime.utcnow())
+                    setattr(user, 'birth_year', self._birth_year(info[key]))
 
                 if key == 'deleted' and info[key] == True:
-                    # delete the cached session key associated with this user
-                    cache_helper.delete_cached_auth_keys_by_token(g.token)
+                    # end the sessions of this user
+                    cache_helper.revoke_sessions(user.id)
                     setattr(user, 'last_deleted_time', datetime.utcnow())
 
+                if key == 'password':
+                    # sessions started with the old password end with it
+                    cache_helper.revoke_sessions(user.id)
+
         # update user preference
         if 'preference' in info:
             if user.preference:
@@ -46,9 +83,15 @@ class UserData(BaseData):
                 pref = PreferenceModel(info['preference'])
                 user.preference = pref
 
+        # incremented by the db, so concurrent writes never end up with the same version
+        user.version = UserModel.version + 1
+
         db.session.add(user)
         db.session.commit()
 
+        self._refresh_match_index(user)
+        self._invalidate_caches(user.id, user.version)
+
         return user
 
     def delete(self, user):
@@ -60,9 +103,13 @@ class UserData(BaseData):
         """
 
         user.deleted = datetime.utcnow()
+        user.version = UserModel.version + 1
         db.session.add(user)
         db.session.commit()
 
+        _match_index.remove(user.id)
+        self._invalidate_caches(user.id, user.version)
+
         return True
 
     def hard_delete(self, user):
@@ -72,9 +119,16 @@ class UserData(BaseData):
         :param user: user model
         :return:
         """
+        user_id = user.id
+        # newer than any doc loaded before the delete
+        version = user.version + 1
+
         db.session.delete(user)
         db.session.commit()
 
+        _match_index.remove(user_id)
+        self._invalidate_caches(user_id, version)
+
     def get_user_by_user_email(self, user_email):
         """
         Get a user model by user_email
@@ -84,28 +138,523 @@ class UserData(BaseData):
         """
         return db.session.query(UserModel).filter_by(email=user_email).first()
 
-    def get_qualified_users(self, individual_preference, shared_preference, page=1):
+    def get_qualified_users(self, individual_preference, shared_preference, page=1, cursor=None, search_text=None,
+                            fields=None):
         """
-        Get a list of qualified users
+        Get a list of qualified users ordered by id
+
+        When a cursor is given, the page starts right after the user the cursor
+        points to and `page` is ignored.
 
         :param individual_preference:
         :param shared_preference:
+        :param page:
+        :param cursor: opaque cursor returned with the previous page
+        :param search_text: words that must appear in the user descriptions
+        :param fields: column and relationship names to load, None for all
+        :return: (list of users, cursor of the next page or None)
+        """
+
+        per_page = Config.NUMBER_PER_PAGE
+        last_id = None
+        if cursor:
+            values = string_helper.decode_cursor(cursor)
+            # a negative id would shift the match index bitmap by a negative count
+            if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+                raise Exception(u'Invalid cursor {0}.'.format(cursor))
+
+            last_id = values[0]
+            page = 1
+
+        # a text search is paged in the db, which applies the filters along with the full text index
+        if Config.MATCH_INDEX_ENABLED and not search_text:
+            match_index = self.get_match_index()
+            bitmap = self.match_qualified_users(match_index, individual_preference, shared_preference)
+            if last_id is not None:
+                # keyset: drop every user up to and including the last one seen
+                bitmap = bitmap >> (last_id + 1) << (last_id + 1)
+
+            # fetch one extra id to know whether there is a next page
+            user_ids = match_index.page(bitmap, page, per_page + 1)
+            users = self.get_users_by_ids(user_ids[:per_page], fields=fields)
+            has_next = len(user_ids) > per_page
+        else:
+            query = self.qualified_users_query(individual_preference, shared_preference, search_text)
+            if last_id is not None:
+                query = query.filter(UserModel.id > last_id)
+
+            users = query.options(*self._load_fields_options(fields)) \
+                .order_by(UserModel.id) \
+                .offset((max(page, 1) - 1) * per_page) \
+                .limit(per_page + 1) \
+                .all()
+            has_next = len(users) > per_page
+            users = users[:per_page]
+
+        next_cursor = string_helper.encode_cursor(users[-1].id) if has_next else None
+
+        return users, next_cursor
+
+    def iter_qualified_users(self, individual_preference, shared_preference, search_text=None):
+        """
+        Iterate over all the qualified users ordered by id
+
+        Rows are streamed from a server-side cursor in batches of
+        Config.EXPORT_BATCH_SIZE, so memory does not grow with the result size.
+
+        :param individual_preference:
+        :param shared_preference:
+        :param search_text: words that must appear in the user descriptions
+        :return: iterator of users
+        """
+
+        return self.qualified_users_query(individual_preference, shared_preference, search_text) \
+            .order_by(UserModel.id) \
+            .yield_per(Config.EXPORT_BATCH_SIZE)
+
+    def get_compatible_users(self, user_id, individual_preference, shared_preference, page=1, cursor=None,
+                             search_text=None, fields=None):
+        """
+        Get a list of qualified users ranked by mutual compatibility with the given user
+
+        :param user_id: id of the searching user
+        :param individual_preference:
+        :param shared_preference:
+        :param page:
+        :param cursor: opaque cursor returned with the previous page
+        :param search_text: words that must appear in the user descriptions
+        :param fields: column and relationship names to load, None for all
+        :return: (list of users, cursor of the next page or None)
+        """
+
+        if not Config.MATCH_INDEX_ENABLED:
+            raise Exception(u'Ranking by compatibility needs the match index.')
+
+        last_key = None
+        if cursor:
+            last_key = string_helper.decode_cursor(cursor)
+            if len(last_key) != 2 or not all(isinstance(value, int) for value in last_key):
+                raise Exception(u'Invalid cursor {0}.'.format(cursor))
+            page = 1
+
+        match_index = self.get_match_index()
+        self.ensure_in_match_index(user_id)
+        bitmap = self.match_qualified_users(match_index, individual_preference, shared_preference, search_text)
+
+        ranked = compat_ranker.rank(match_index,
+                                    user_id,
+                                    bitmap,
+                                    page,
+                                    Config.NUMBER_PER_PAGE,
+                                    last_key=last_key)
+
+        users_by_id = {user.id: user for user in self.get_users_by_ids([rank_id for rank_id, _ in ranked.items],
+                                                                       fields=fields)}
+        users = [users_by_id[rank_id] for rank_id, _ in ranked.items if rank_id in users_by_id]
+
+        next_cursor = None
+        if ranked.has_next:
+            last_id, last_score = ranked.items[-1]
+            next_cursor = string_helper.encode_cursor(last_score, last_id)
+
+        return users, next_cursor
+
+    def get_version(self, user_id):
+        """
+        Get the version of a user without loading the row
+
+        :param user_id:
+        :return: version, None if the user does not exist or is deleted
+        """
+
+        return db.session.query(UserModel.version) \
+            .filter(UserModel.id == user_id, UserModel.deleted == False) \
+            .scalar()
+
+    def get_users_by_ids(self, user_ids, fields=None):
+        """
+        Get a list of users ordered by id
+
+        :param user_ids:
+        :param fields: column and relationship names to load, None for all
         :return:
         """
-        query = db.session.query(UserModel)
+
+        if not user_ids:
+            return []
+
+        return db.session.query(UserModel) \
+            .options(*self._load_fields_options(fields)) \
+            .filter(UserModel.id.in_(user_ids)) \
+            .order_by(UserModel.id) \
+            .all()
+
+    def qualified_users_query(self, individual_preference, shared_preference, search_text=None):
+        """
+        Build the sql query for the qualified users
+
+        :param individual_preference:
+        :param shared_preference:
+        :param search_text: words that must appear in the user descriptions
+        :return: query
+        """
+
+        query = db.session.query(UserModel).filter(UserModel.deleted == False)
+
+        if search_text:
+            query = query.filter(self._search_text_clause(search_text))
 
         for attr, value in individual_preference.items():
-            if attr == 'age_group':
-                # Need to add the time between now and age_last_modified to get
-                # the real user age
-                user_age = UserModel.age + (datetime.utcnow().year - db.extract('year', UserModel.age_last_modified))
-                query = query.filter(user_age.in_(AGE_GROUPS[value]))
-            else:
-                query = query.filter(getattr(UserModel, attr)==value)
+            query = query.filter(self._individual_preference_clause(attr, value))
+
+        if shared_preference:
+            query = query.join(UserModel.preference)
+            budget_min, budget_max, household_size_min, household_size_max = \
+                self._shared_preference_ranges(shared_preference)
+
+            if budget_min is not None or budget_max is not None:
+                # backed by the gist index on the budget range
+                budget_range = db.func.int4range(PreferenceModel.budget_min, PreferenceModel.budget_max, '[]')
+                query = query.filter(budget_range.op('&&')(db.func.int4range(budget_min, budget_max, '[]')))
+
+            if household_size_min is not None:
+                query = query.filter(PreferenceModel.household_size >= household_size_min)
+
+            if household_size_max is not None:
+                query = query.filter(PreferenceModel.household_size <= household_size_max)
+
+        return query
+
+    def match_qualified_users(self, match_index, individual_preference, shared_preference, search_text=None):
+        """
+        Get the bitmap of qualified users from the match index
+
+        :param match_index:
+        :param individual_preference:
+        :param shared_preference:
+        :param search_text: words that must appear in the user descriptions
+        :return: bitmap
+        """
+
+        bitmap = match_index.users
+
+        for attr, value in individual_preference.items():
+            bitmap &= self._individual_preference_bitmap(match_index, attr, value)
 
         if shared_preference:
-            query.join(UserModel.preference)
-            for attr, value in shared_preference.items():
-                query = query.filter(getattr(PreferenceModel, attr)==value)
+            bitmap &= match_index.bitmap('has_preference', [1])
+            budget_min, budget_max, household_size_min, household_size_max = \
+                self._shared_preference_ranges(shared_preference)
+
+            if budget_min is not None or budget_max is not None:
+                bitmap &= match_index.overlap('budget_min', 'budget_max', budget_min, budget_max)
+
+            if household_size_min is not None or household_size_max is not None:
+                bitmap &= match_index.between('household_size', household_size_min, household_size_max)
+
+        if search_text:
+            # the full text index lives in the db, so the db applies every filter along with it,
+            # and only the ids of qualified users come back
+            query = self.qualified_users_query(individual_preference, shared_preference, search_text) \
+                .with_entities(UserModel.id)
+            bitmap &= MatchIndex.bitmap_from_ids(row.id for row in query)
+
+        return bitmap
+
+    def get_facet_counts(self, individual_preference, shared_preference, search_text=None):
+        """
+        Count the qualified users for every gender, education and age_group value
+
+        The counts of a facet apply every filter except the facet's own.
+
+        :param individual_preference:
+        :param shared_preference:
+        :param search_text: words that must appear in the user descriptions
+        :return: {facet: {value: count}}
+        """
+
+        facet_values = self._facet_values()
+        facets = {facet: {} for facet in facet_values}
+
+        # a text search is counted in the db, which applies the filters along with the full text index
+        if Config.MATCH_INDEX_ENABLED and not search_text:
+            match_index = self.get_match_index()
+            base = self.match_qualified_users(match_index, {}, shared_preference)
+            filter_bitmaps = {attr: self._individual_preference_bitmap(match_index, attr, value)
+                              for attr, value in individual_preference.items()}
+
+            for facet, values in facet_values.items():
+                bitmap = base
+                for attr, filter_bitmap in filter_bitmaps.items():
+                    if attr != facet:
+                        bitmap &= filter_bitmap
+
+                for value in values:
+                    value_bitmap = self._individual_preference_bitmap(match_index, facet, value)
+                    facets[facet][value] = match_index.count(bitmap & value_bitmap)
+
+            return facets
+
+        # one pass over the qualified users, one filtered count per facet value
+        filter_clauses = {attr: self._individual_preference_clause(attr, value)
+                          for attr, value in individual_preference.items()}
+        counts = []
+        for facet, values in facet_values.items():
+            other_clauses = [clause for attr, clause in filter_clauses.items() if attr != facet]
+            for value in values:
+                clause = db.and_(self._individual_preference_clause(facet, value), *other_clauses)
+                counts.append(db.func.count(UserModel.id).filter(clause))
+
+        row = self.qualified_users_query({}, shared_preference, search_text).with_entities(*counts).one()
+
+        row_values = iter(row)
+        for facet, values in facet_values.items():
+            for value in values:
+                facets[facet][value] = next(row_values)
+
+        return facets
+
+    def get_match_index(self):
+        """
+        Get the match index, (re)loading it from the db when it is missing or stale
+
+        A stale index is rebuilt by one request at a time, the others keep using it meanwhile.
+
+        :return: match index
+        """
+
+        _match_index.refresh(self._match_index_records, Config.MATCH_INDEX_REFRESH_IN_SECS)
+
+        return _match_index
+
+    def ensure_in_match_index(self, user_id):
+        """
+        Load a single user into the match index, if it was written through another process since the index was
+
+        :param user_id:
+        :return:
+        """
+
+        match_index = self.get_match_index()
+        if match_index.users >> user_id & 1:
+            return
+
+        user = self.get(user_id)
+        if user is None or user.deleted:
+            raise Exception(u'Invalid user id.')
+
+        match_index.set(user.id, self._match_index_values(user))
+
+    @staticmethod
+    def _match_index_records():
+        """
+        Get the values stored in the match index for every user that is not deleted
+
+        :return: iterable of (user id, dictionary of column values)
+        """
+
+        query = db.session.query(UserModel.id,
+                                 UserModel.gender,
+                                 UserModel.education,
+                                 UserModel.birth_year,
+                                 PreferenceModel.gender.label('preference_gender'),
+                                 PreferenceModel.education.label('preference_education'),
+                                 PreferenceModel.age_group.label('preference_age_group'),
+                                 (PreferenceModel.id != None).label('has_preference'),
+                                 PreferenceModel.budget_max,
+                                 PreferenceModel.budget_min,
+                                 PreferenceModel.household_size) \
+            .outerjoin(UserModel.preference) \
+            .filter(UserModel.deleted == False)
+
+        return ((row.id, row._asdict()) for row in query)
+
+    def _refresh_match_index(self, user):
+        """
+        Keep the match index in sync with a user that was just written
+
+        :param user: user model
+        :return:
+        """
+
+        if not _match_index.loaded:
+            return
+
+        if user.deleted:
+            _match_index.remove(user.id)
+        else:
+            _match_index.set(user.id, self._match_index_values(user))
+
+    @staticmethod
+    def _load_fields_options(fields):
+        """
+        Get the query options that load only the given fields of the users
+
+        Columns that are not loaded are never decrypted either.
+
+        :param fields: column and relationship names, None for all
+        :return: list of query options
+        """
+
+        if fields is None:
+            return []
+
+        # id and version identify the serialized user, see user_service.get_user_fragments()
+        columns = ['id', 'version'] + [field for field in fields if field in UserModel.__table__.columns.keys()]
+        options = [load_only(*columns)]
+
+        if 'preference' not in fields:
+            options.append(noload(UserModel.preference))
+
+        return options
+
+    @staticmethod
+    def _invalidate_caches(user_id, version):
+        """
+        Drop the cached data that a write to the user makes stale
+
+        :param user_id:
+        :param version: version of the user after the write
+        :return:
+        """
+
+        cache_helper.invalidate_user_doc(user_id, version)
+        cache_helper.invalidate_search_results()
+
+    @staticmethod
+    def _match_index_values(user):
+        """
+        Get the values stored in the match index for a user
+
+        :param user: user model
+        :return: dictionary
+        """
+
+        preference = user.preference
+
+        return {
+            'gender': user.gender,
+            'education': user.education,
+            'birth_year': user.birth_year,
+            'preference_gender': preference.gender if preference else None,
+            'preference_education': preference.education if preference else None,
+            'preference_age_group': preference.age_group if preference else None,
+            'has_preference': 1 if preference else None,
+            'budget_max': preference.budget_max if preference else None,
+            'budget_min': preference.budget_min if preference else None,
+            'household_size': preference.household_size if preference else None
+        }
+
+    def _individual_preference_clause(self, attr, value):
+        """
+        Get the sql clause of an individual preference filter
+
+        :param attr: e.g. 'gender' or 'age_group'
+        :param value:
+        :return: sql clause
+        """
+
+        if attr == 'age_group':
+            min_birth_year, max_birth_year = self._birth_year_range(value)
+            return UserModel.birth_year.between(min_birth_year, max_birth_year)
+
+        return getattr(UserModel, attr) == value
+
+    def _individual_preference_bitmap(self, match_index, attr, value):
+        """
+        Get the match index bitmap of an individual preference filter
+
+        :param match_index:
+        :param attr: e.g. 'gender' or 'age_group'
+        :param value:
+        :return: bitmap
+        """
+
+        if attr == 'age_group':
+            min_birth_year, max_birth_year = self._birth_year_range(value)
+            return match_index.bitmap('birth_year', range(min_birth_year, max_birth_year + 1))
+
+        return match_index.bitmap(attr, [value])
+
+    @staticmethod
+    def _facet_values():
+        """
+        Get the values of every facet in display order
+
+        :return: {facet: [values]}
+        """
+
+        return {
+            'gender': list(UserModel.__table__.columns['gender'].type.enums),
+            'education': list(UserModel.__table__.columns['education'].type.enums),
+            'age_group': list(PreferenceModel.__table__.columns['age_group'].type.enums)
+        }
+
+    @staticmethod
+    def _shared_preference_ranges(shared_preference):
+        """
+        Turn the shared preference filters into inclusive ranges
+
+        An exact household_size narrows the household size range to one value.
+
+        :param shared_preference:
+        :return: (budget min, budget max, household size min, household size max), None when unbounded
+        """
+
+        ranges = {}
+        for attr in ['budget_min', 'budget_max', 'household_size', 'household_size_min', 'household_size_max']:
+            value = shared_preference.get(attr)
+            try:
+                ranges[attr] = int(value) if value is not None else None
+            except (ValueError, TypeError):
+                raise Exception(u'{0} must be an integer.'.format(attr))
+
+        if ranges['household_size'] is not None:
+            ranges['household_size_min'] = ranges['household_size_max'] = ranges['household_size']
+
+        for attr in ['budget', 'household_size']:
+            low, high = ranges[attr + '_min'], ranges[attr + '_max']
+            if low is not None and high is not None and low > high:
+                raise Exception(u'{0}_min must not be greater than {0}_max.'.format(attr))
+
+        return ranges['budget_min'], ranges['budget_max'], ranges['household_size_min'], ranges['household_size_max']
+
+    @staticmethod
+    def _search_text_clause(search_text):
+        """
+        Get the full text search clause, backed by the gin index on search_vector
+
+        :param search_text:
+        :return: sql clause
+        """
+
+        return UserModel.search_vector.op('@@')(db.func.plainto_tsquery(SEARCH_TEXT_CONFIG, search_text))
+
+    @staticmethod
+    def _birth_year(age):
+        """
+        Estimate the birth year from an age given now
+
+        :param age:
+        :return: birth year or None
+        """
+
+        if age is None:
+            return None
+        return datetime.utcnow().year - int(age)
+
+    @staticmethod
+    def _birth_year_range(age_group):
+        """
+        Get the inclusive birth year range of an age group
+
+        :param age_group: e.g. '25-30'
+        :return: (min birth year, max birth year)
+        """
+
+        if age_group not in AGE_GROUPS:
+            raise Exception(u'Invalid age group {0}.'.format(age_group))
 
-        return query.paginate(page, Config.NUMBER_PER_PAGE, False).items
+        current_year = datetime.utcnow().year
+        ages = AGE_GROUPS[age_group]
+        return current_year - max(ages), current_year - min(ages)
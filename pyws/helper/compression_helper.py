@@ -0,0 +1,90 @@
+import gzip
+import zlib
+
+from flask import request
+
+from config import Config
+
+# content encodings we can produce, preferred first
+ENCODINGS = ['gzip', 'deflate']
+
+# encodings that cached responses are stored under besides the raw bytes
+PRECOMPRESSED_ENCODINGS = ['gzip']
+
+COMPRESSIBLE_MIMETYPES = ['application/json']
+
+
+def compress(data, encoding):
+    """
+    Compress a response body
+
+    :param data: bytes
+    :param encoding: 'gzip' or 'deflate'
+    :return: compressed bytes
+    """
+
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=Config.COMPRESSION_LEVEL)
+
+    if encoding == 'deflate':
+        return zlib.compress(data, Config.COMPRESSION_LEVEL)
+
+    raise Exception(u'Invalid content encoding {0}.'.format(encoding))
+
+
+def precompress(data):
+    """
+    Compress a response body that is about to be cached, so cache hits don't compress it again
+
+    :param data: bytes
+    :return: dictionary of encoding to compressed bytes, empty below the compression threshold
+    """
+
+    if len(data) < Config.COMPRESSION_THRESHOLD_IN_BYTES:
+        return {}
+
+    return {encoding: compress(data, encoding) for encoding in PRECOMPRESSED_ENCODINGS}
+
+
+def compress_response(response):
+    """
+    Compress the response body with the best encoding the client accepts
+
+    Streamed responses, responses that are not json and bodies below the
+    threshold are left alone. A body found in response.precompressed under
+    the chosen encoding is used as is.
+
+    :param response:
+    :return: response
+    """
+
+    if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+        return response
+
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_THRESHOLD_IN_BYTES:
+        return response
+
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+
+    precompressed = getattr(response, 'precompressed', {})
+    if encoding in precompressed:
+        response.set_data(precompressed[encoding])
+    else:
+        response.set_data(compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+
+    # the compressed body is a different representation, so the etag can only match weakly
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
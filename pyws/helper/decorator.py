@@ -6,10 +6,9 @@ from functools import wraps
 from inspect import getcallargs
 from config import Config
 
-from pyws.cache.redis_connector import RedisStore
-from pyws.cache.cache_constants import REQUEST_LIMIT_KEY, TOKEN_USER_KEY
-
-_redis_store = RedisStore()
+from pyws.cache import cache_helper
+from pyws.helper import schema_helper
+from pyws.cache.cache_constants import REQUEST_LIMIT_KEY
 
 
 def async(f):
@@ -46,47 +45,16 @@ def validate_json(required_fields=None, allowed_model=None):
 
         1. Makes sure that a valid json object is part of the request
         2. Makes sure the json object contains 'email' and 'password'
-        3. Makes sure the json object conforms to columns on user model as well as its relationship model
+        3. Makes sure the json object conforms to columns on user model as well as its relationship model,
+           including the type and enum values of the columns
 
     :param required_fields: list
     :param allowed_model: model
     :return:
     """
 
-    def check_json_against_model(json, model):
-        """
-        Get fields in the json that is not allowed by the model
-
-        :param json:
-        :param model:
-        :return: {
-                     'user': ['exra_1', 'extra_2']
-                     'preference': ['extra_3', 'extra_4']
-                 }
-        """
-
-        not_allowed_fields = []
-        result = {}
-        if not isinstance(json, dict):
-            raise Exception(u"'{0}' is not a invalid hash.".format(json))
-
-        for field in json:
-            if '_relationships' in dir(model) and field in model.relationships():
-                    relationship_model = model.relationships()[field]
-                    if isinstance(json[field], list):
-                        for each in json[field]:
-                            result.update(check_json_against_model(each, relationship_model))
-                    else:
-                        result.update(check_json_against_model(json[field], relationship_model))
-
-            elif field not in model.__table__.columns.keys():
-                not_allowed_fields.append(field)
-
-        if not not_allowed_fields:
-            return result
-
-        result.update({model.__tablename__: not_allowed_fields})
-        return result
+    # compiled once here, not on every request
+    schema = schema_helper.get_schema(allowed_model) if allowed_model else None
 
     def decorator(f):
         @wraps(f)
@@ -110,8 +78,8 @@ def validate_json(required_fields=None, allowed_model=None):
                     raise Exception(u'Required fields [ {0} ] are missing from json payload.'
                                     .format(', '.join(missing_fields)))
 
-            if allowed_model:
-                extra_fields = check_json_against_model(json, allowed_model)
+            if schema:
+                extra_fields = schema_helper.check_json(schema, json)
 
                 if extra_fields:
                     raise Exception(u'These fields {0} are not allowed in the json payload.'
@@ -169,46 +137,56 @@ def validate_file(allowed_extensions=None):
     return decorator
 
 
-def limit(requests=100, window=60, by="ip", group=None):
+def limit(requests=100, window=60, by="ip", group=None, lease=1, lease_timeout=1):
     """
-    **User Example**
+    **User Example 1**
 
         @limit(requests=100, window=60, by="ip", group=None)
         def authenticate_user():
             pass
 
-        1. Makes sure that only 100 requests are allowed in 60 secs
+        1. Makes sure that only 100 requests are allowed in any 60 secs
            for authenticate_user() endpoint by the same ip address
+        2. Puts the outcome on g.rate_limit for the X-RateLimit-* response headers
+
+    **User Example 2**
+
+        @limit(requests=100, window=60, by="ip", lease=10)
+        def get_user(user_id):
+            pass
+
+        1. Same as above, but each process takes 10 requests from redis at once
+           and only goes back to redis when they run out or after 1 sec
 
     :param requests: max number of requests allowed
     :param window: duration in secs for the max allowed requests
-    :param by: request originator
+    :param by: request originator, "ip" or "user" for the authenticated user
     :param group: request endpoint
+    :param lease: requests taken from redis at once, higher means fewer redis round trips but a less exact limit
+    :param lease_timeout: secs a process can hand out leased requests for
     :return:
     """
 
     if not callable(by):
-        by = { 'ip': lambda: request.remote_addr }[by]
+        by = {
+            'ip': lambda: request.remote_addr,
+            # anonymous callers are limited by ip
+            'user': lambda: request.remote_addr if g.get('user_id') is None else u'user:{0}'.format(g.user_id)
+        }[by]
 
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             local_group = group or request.endpoint
-            key = REQUEST_LIMIT_KEY.format(endpoint=local_group, ip=by())
+            key = REQUEST_LIMIT_KEY.format(endpoint=local_group, originator=by())
 
-            try:
-                remaining = requests - int(_redis_store.get(key))
-            except (ValueError, TypeError):
-                remaining = requests
-                _redis_store.set(key, 0, timeout_in_sec=None)
-
-            ttl = _redis_store.ttl(key)
-            if not ttl:
-                _redis_store.expire(key, window)
-
-            if remaining > 0:
-                _redis_store.incr(key, 1)
-            else:
+            g.rate_limit = cache_helper.check_rate_limit(key,
+                                                         requests,
+                                                         window,
+                                                         lease=lease,
+                                                         lease_timeout_in_sec=lease_timeout)
+
+            if not g.rate_limit.allowed:
                 raise Exception(u'Too many requests.')
 
             return f(*args, **kwargs)
@@ -216,6 +194,25 @@ def limit(requests=100, window=60, by="ip", group=None):
     return decorator
 
 
+def authenticate():
+    """
+    Makes sure that the caller is authenticated, i.e. There is a valid token in the header
+
+    Used by auth_required, and by views that only need authentication for some requests.
+
+    :return: True for the privileged token, which belongs to no user
+    """
+
+    if g.token == Config.SECRET_KEY:
+        return True
+
+    # resolved once per request by before_request_callback
+    if g.get('user_id') is None:
+        raise Exception(u'Authentication required.')
+
+    return False
+
+
 def auth_required(*resources):
     """
     **User Example 1**
@@ -241,14 +238,13 @@ def auth_required(*resources):
 
     def user_id_validator(user_id):
         """
-        Checked to see if the cached user id corresponding to the token is the same as the accessed user id
+        Checked to see if the user id resolved from the token is the same as the accessed user id
 
         :param user_id:
         :return:
         """
 
-        cached_user_info = _redis_store.hgetall(TOKEN_USER_KEY.format(token=g.token))
-        return user_id == cached_user_info['id']
+        return user_id == str(g.user_id)
 
     resource_validator_map = {
         'user_id': user_id_validator
@@ -258,13 +254,9 @@ def auth_required(*resources):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             # bypass authentication with privileged token
-            if g.token == Config.SECRET_KEY:
+            if authenticate():
                 return f(*args, **kwargs)
 
-            token_exits = _redis_store.exists(TOKEN_USER_KEY.format(token=g.token))
-            if token_exits is False:
-                raise Exception(u'Authentication required.')
-
             function_arg_value_dict = getcallargs(f, *args, **kwargs)
             for resource in resources:
                 # check to see if the resource is passed in as a function parameter
@@ -279,3 +271,26 @@ def auth_required(*resources):
             return f(*args, **kwargs)
         return decorated_function
     return decorator
+
+
+def privileged_required(f):
+    """
+    **User Example 1**
+
+        @privileged_required
+        def get_stats():
+            pass
+
+        1. Makes sure that the caller holds the privileged token
+
+    :param f:
+    :return:
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if g.token != Config.SECRET_KEY:
+            raise Exception(u'Privileged token required.')
+
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,71 @@
+import json
+from datetime import date
+
+from config import Config
+
+# optional native encoders, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _default(obj):
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(u'{0!r} is not json serializable.'.format(obj))
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, default=_default).encode('UTF-8')
+
+
+def _orjson_dumps(obj):
+    # datetimes are encoded natively, in the same format as isoformat()
+    return orjson.dumps(obj)
+
+
+def _ujson_dumps(obj):
+    return ujson.dumps(obj, default=_default, escape_forward_slashes=False).encode('UTF-8')
+
+
+# (name, module, dumps, loads) of every supported encoder, fastest first
+_ENCODERS = [('orjson', orjson, _orjson_dumps, orjson and orjson.loads),
+             ('ujson', ujson, _ujson_dumps, ujson and ujson.loads),
+             ('json', json, _json_dumps, json.loads)]
+
+
+def available_encoders():
+    """
+    Get the names of the installed encoders, fastest first
+
+    :return: list of encoder names
+    """
+    return [name for name, module, _, _ in _ENCODERS if module is not None]
+
+
+def get_encoder(name):
+    """
+    Get the dumps and loads functions of an encoder
+
+    :param name: 'orjson', 'ujson', 'json', or 'auto' for the fastest installed one
+    :return: (dumps, loads); dumps returns utf-8 encoded bytes
+    """
+    if name == 'auto':
+        name = available_encoders()[0]
+
+    for encoder_name, module, encoder_dumps, encoder_loads in _ENCODERS:
+        if encoder_name == name:
+            if module is None:
+                raise Exception(u'Json encoder {0} is not installed.'.format(name))
+            return encoder_dumps, encoder_loads
+
+    raise Exception(u'Invalid json encoder {0}.'.format(name))
+
+
+dumps, loads = get_encoder(Config.JSON_ENCODER)
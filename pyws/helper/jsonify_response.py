@@ -1,12 +1,97 @@
-import json
-from flask import current_app
+from flask import current_app, stream_with_context
+
+from pyws.helper import json_helper
+
+
+class RawJson(object):
+    """
+    Already serialized json, written into a jsonify_response as is
+    """
+
+    def __init__(self, json):
+        self.json = json
+
+
+def raw_json_list(fragments):
+    """
+    Join serialized json values into a serialized list
+
+    :param fragments: list of json bytes
+    :return: RawJson
+    """
+    return RawJson(b'[' + b', '.join(fragments) + b']')
 
 
 def jsonify_response(status_code=200, *args, **kwargs):
 
-    json_response = json.dumps(dict(*args, **kwargs))
+    obj = dict(*args, **kwargs)
+
+    if any(isinstance(value, RawJson) for value in obj.values()):
+        json_response = b'{' + b', '.join(json_helper.dumps(key) + b': ' + _dumps(value)
+                                          for key, value in obj.items()) + b'}'
+    else:
+        json_response = json_helper.dumps(obj)
+
+    response = current_app.response_class(json_response,
+                                  mimetype='application/json')
+    response.status_code = status_code
+
+    return response
+
+
+def json_response(json_response, status_code=200, precompressed=None):
+    """
+    Build a response from an already serialized json
+
+    :param json_response: json string or bytes
+    :param status_code:
+    :param precompressed: dictionary of content encoding to the compressed json, see compression_helper
+    :return: response
+    """
+
     response = current_app.response_class(json_response,
                                   mimetype='application/json')
     response.status_code = status_code
+    response.precompressed = precompressed or {}
 
     return response
+
+
+def not_modified_response(etag):
+    """
+    Build an empty 304 response telling the client its copy is still current
+
+    :param etag: etag of the client's copy
+    :return: response
+    """
+
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+
+    return response
+
+
+def ndjson_response(objects, status_code=200):
+    """
+    Build a streamed response with one json object per line
+
+    :param objects: iterable of json serializable objects, consumed lazily
+    :param status_code:
+    :return: response
+    """
+
+    def generate():
+        for obj in objects:
+            yield json_helper.dumps(obj) + b'\n'
+
+    response = current_app.response_class(stream_with_context(generate()),
+                                          mimetype='application/x-ndjson')
+    response.status_code = status_code
+
+    return response
+
+
+def _dumps(value):
+    if isinstance(value, RawJson):
+        return value.json
+    return json_helper.dumps(value)
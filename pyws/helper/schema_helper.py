@@ -0,0 +1,158 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+from sqlalchemy import Boolean, Enum, Integer, String
+
+# what a json value must look like to be written to a column
+ColumnRule = namedtuple('ColumnRule', ['python_type', 'type_name', 'enums', 'max_length', 'nullable'])
+
+# everything validate_json and clean_info need to know about a model, worked out once
+ModelSchema = namedtuple('ModelSchema', ['table_name', 'columns', 'relationships', 'private_columns'])
+
+# compiled schemas by model class
+_schemas = {}
+
+
+def get_schema(model):
+    """
+    Get the compiled schema of a model, compiling it on first use
+
+    :param model: model class
+    :return: ModelSchema
+    """
+
+    schema = _schemas.get(model)
+    if schema is None:
+        schema = _compile_schema(model)
+        _schemas[model] = schema
+
+    return schema
+
+
+def _compile_schema(model):
+    relationships = {}
+    if hasattr(model, '_relationships'):
+        relationships = {name: get_schema(relationship_model)
+                         for name, relationship_model in model.relationships().items()}
+
+    private_columns = frozenset()
+    if hasattr(model, '_private_columns'):
+        private_columns = frozenset(model.private_columns())
+
+    columns = {column.key: _column_rule(column) for column in model.__table__.columns}
+
+    return ModelSchema(table_name=model.__tablename__,
+                       columns=MappingProxyType(columns),
+                       relationships=MappingProxyType(relationships),
+                       private_columns=private_columns)
+
+
+def _column_rule(column):
+    # encrypted columns are checked against the type they encrypt, but their
+    # length is that of the ciphertext
+    column_type = getattr(column.type, 'underlying_type', column.type)
+    is_encrypted = column_type is not column.type
+
+    if isinstance(column_type, Enum):
+        return ColumnRule(str, 'a string', tuple(column_type.enums), None, column.nullable)
+
+    if isinstance(column_type, String):
+        max_length = None if is_encrypted else column_type.length
+        return ColumnRule(str, 'a string', None, max_length, column.nullable)
+
+    if isinstance(column_type, Boolean):
+        return ColumnRule(bool, 'a boolean', None, None, column.nullable)
+
+    if isinstance(column_type, Integer):
+        return ColumnRule(int, 'an integer', None, None, column.nullable)
+
+    # other types are left for the db to check
+    return ColumnRule(None, None, None, None, column.nullable)
+
+
+def check_json(schema, json):
+    """
+    Check a json payload against a model schema in one pass
+
+    Values of public columns must have the column's type, fit its length
+    and be one of its enum values. Private columns are not checked, they
+    are removed by clean_json().
+
+    :param schema: ModelSchema
+    :param json: dictionary
+    :return: fields that are not allowed by the model, e.g.
+             {
+                 'user': ['extra_1', 'extra_2'],
+                 'preference': ['extra_3', 'extra_4']
+             }
+    """
+
+    if not isinstance(json, dict):
+        raise Exception(u"'{0}' is not a invalid hash.".format(json))
+
+    not_allowed_fields = []
+    result = {}
+
+    for field, value in json.items():
+        if field in schema.relationships:
+            relationship_schema = schema.relationships[field]
+            if isinstance(value, list):
+                for each in value:
+                    result.update(check_json(relationship_schema, each))
+            else:
+                result.update(check_json(relationship_schema, value))
+
+        elif field not in schema.columns:
+            not_allowed_fields.append(field)
+
+        elif field not in schema.private_columns:
+            _check_value(field, value, schema.columns[field])
+
+    if not_allowed_fields:
+        result[schema.table_name] = not_allowed_fields
+
+    return result
+
+
+def _check_value(field, value, rule):
+    if value is None:
+        if not rule.nullable:
+            raise Exception(u'Field {0} can not be null.'.format(field))
+        return
+
+    if rule.python_type is None:
+        return
+
+    # bool is a subclass of int, but true is not an integer
+    if not isinstance(value, rule.python_type) or (isinstance(value, bool) and rule.python_type is not bool):
+        raise Exception(u'Field {0} must be {1}.'.format(field, rule.type_name))
+
+    if rule.enums is not None and value not in rule.enums:
+        raise Exception(u'Field {0} must be one of [ {1} ].'.format(field, ', '.join(rule.enums)))
+
+    if rule.max_length is not None and len(value) > rule.max_length:
+        raise Exception(u'Field {0} must be at most {1} characters.'.format(field, rule.max_length))
+
+
+def clean_json(schema, info):
+    """
+    Remove the private columns of the model and its relationships from the info
+
+    :param schema: ModelSchema
+    :param info: dictionary
+    :return:
+    """
+
+    if not isinstance(info, dict):
+        raise Exception(u"'{0}' is not a invalid hash.".format(info))
+
+    for field in list(info.keys()):
+        if field in schema.private_columns:
+            del info[field]
+
+        elif field in schema.relationships:
+            if isinstance(info[field], list):
+                for each in info[field]:
+                    clean_json(schema.relationships[field], each)
+            else:
+                clean_json(schema.relationships[field], info[field])
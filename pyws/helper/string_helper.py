@@ -1,7 +1,95 @@
 import base64
+import hashlib
+import hmac
+import json
+import time
 import uuid
 
 
 def generate_guid():
     guid = base64.urlsafe_b64encode(uuid.uuid4().hex.encode('UTF-8')).decode('ascii')
     return guid[:-1]
+
+
+def encode_cursor(*values):
+    """
+    Encode the sort key values of the last row of a page into an opaque cursor
+
+    :param values: e.g. (sort key, id)
+    :return: cursor string
+    """
+    payload = json.dumps(list(values), separators=(',', ':')).encode('UTF-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor()
+
+    :param cursor: cursor string
+    :return: list of sort key values
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload.decode('UTF-8'))
+    except (ValueError, TypeError):
+        raise Exception(u'Invalid cursor {0}.'.format(cursor))
+
+    if not isinstance(values, list):
+        raise Exception(u'Invalid cursor {0}.'.format(cursor))
+
+    return values
+
+
+def sign_token(user_id, generation, secret_key, timeout_in_sec):
+    """
+    Create a session token that carries its own user id, session generation and expiry, signed with the secret key
+
+    :param user_id:
+    :param generation: session generation of the user, the token is void once it is bumped
+    :param secret_key:
+    :param timeout_in_sec: how long the token is valid for
+    :return: '{user_id}.{generation}.{expires_at}.{signature}', expiry in msecs since epoch
+    """
+    expires_at = int(time.time() * 1000) + int(timeout_in_sec * 1000)
+
+    payload = u'{0}.{1}.{2}'.format(user_id, generation, expires_at)
+    return u'{0}.{1}'.format(payload, _token_signature(payload, secret_key))
+
+
+def is_signed_token(token):
+    """
+    Tell a token created by sign_token() from a guid token
+
+    :param token:
+    :return:
+    """
+    return '.' in token
+
+
+def verify_signed_token(token, secret_key):
+    """
+    Verify a token created by sign_token(), without any network call
+
+    :param token:
+    :param secret_key:
+    :return: (user id, session generation), None if the token is forged or expired
+    """
+    payload, _, signature = token.rpartition('.')
+    expected_signature = _token_signature(payload, secret_key)
+
+    if not hmac.compare_digest(signature.encode('UTF-8'), expected_signature.encode('UTF-8')):
+        return None
+
+    # the payload was created by sign_token(), so it always parses
+    user_id, generation, expires_at = (int(value) for value in payload.split('.'))
+
+    if expires_at < time.time() * 1000:
+        return None
+
+    return user_id, generation
+
+
+def _token_signature(payload, secret_key):
+    digest = hmac.new(secret_key.encode('UTF-8'), payload.encode('UTF-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
@@ -3,6 +3,7 @@ from datetime import datetime
 from flask import current_app, g, request
 from pyws import latest
 from pyws.helper.jsonify_response import jsonify_response
+from pyws.helper import compression_helper
 from pyws.cache import cache_helper
 
 
@@ -19,9 +20,8 @@ def before_request_callback(*args, **kwargs):
     if 'x-token' in headers_lowercase_keys:
         g.token = headers_lowercase_keys['x-token']
 
-    # extend auth token keys is token is valid
-    if cache_helper.verify_auth_token(g.token):
-        cache_helper.extend_cached_auth_keys(g.token)
+    # resolve the user of the token once per request, extending the session if valid
+    g.user_id = cache_helper.resolve_session(g.token)
 
     # log request
     current_app.logger.info(u'>>> start request: {0} {1} {2}'
@@ -36,7 +36,15 @@ def after_request_callback(response):
     current_app.logger.info(u'<<< end request: {0} {1} (elapsed = {2} secs)'
                             .format(request.method, request.path, elapsed))
 
-    return response
+    rate_limit = g.get('rate_limit')
+    if rate_limit is not None:
+        response.headers['X-RateLimit-Limit'] = str(rate_limit.limit)
+        response.headers['X-RateLimit-Remaining'] = str(rate_limit.remaining)
+        response.headers['X-RateLimit-Reset'] = str(rate_limit.reset_in_sec)
+        if not rate_limit.allowed:
+            response.headers['Retry-After'] = str(rate_limit.retry_after_in_sec)
+
+    return compression_helper.compress_response(response)
 
 
 @latest.teardown_request
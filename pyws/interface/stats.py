@@ -0,0 +1,54 @@
+from pyws import latest
+from pyws.cache import cache_helper, redis_connector
+from pyws.helper.jsonify_response import jsonify_response
+from pyws.helper.decorator import privileged_required
+
+
+@latest.route('/stats/', methods=['GET'])
+@privileged_required
+def get_stats():
+    """
+    Get the cache and redis statistics of the process that serves the request
+
+    !!!Important!!!
+
+    This end point should not be exposed to public
+
+    **sample request**
+
+        curl -X GET 'http://localhost:5000/stats/'
+        --header "X-TOKEN: this-really-needs-to-be-changed"
+
+    **sample response**
+
+        {
+            "local_cache": {
+                "user_doc": {
+                    "size": 120,
+                    "max_size": 10000,
+                    "hits": 5310,
+                    "misses": 230,
+                    "hit_rate": 0.958,
+                    "evictions": 0
+                },
+                ...
+            },
+            "redis": {
+                "commands": {
+                    "GET": {
+                        "count": 5540,
+                        "errors": 0,
+                        "mean_ms": 0.21,
+                        "max_ms": 3.4
+                    },
+                    ...
+                },
+                "pool_waits": 2,
+                "pool_timeouts": 0
+            }
+        }
+
+    """
+
+    return jsonify_response(local_cache=cache_helper.get_local_cache_stats(),
+                            redis=redis_connector.get_redis_stats())
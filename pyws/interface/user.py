@@ -1,17 +1,28 @@
+import hashlib
+import json
+
 from flask import g, request, render_template
 
 from pyws import latest
 from pyws.email import email_helper
 from pyws.service import user_service, auth_service
-from pyws.helper.jsonify_response import jsonify_response
-from pyws.helper.decorator import limit, validate_json, auth_required
+from pyws.helper.jsonify_response import jsonify_response, json_response, ndjson_response
+from pyws.helper.jsonify_response import raw_json_list, not_modified_response
+from pyws.helper.decorator import limit, validate_json, auth_required, authenticate
 from pyws.helper import data_helper
 from pyws.helper import string_helper
+from pyws.helper import compression_helper
 from pyws.cache import cache_helper
+from pyws.cache.cache_constants import FACET_COUNTS_TIMEOUT_IN_SECS
 from pyws.data.model.user_model import UserModel
 from pyws.data.model.preference_model import PreferenceModel
 from config import Config
 
+# user fields that can be asked for with 'fields'
+_USER_FIELDS = [key for key, column in UserModel.__mapper__.column_attrs.items()
+                if not column.deferred and key not in UserModel.hidden_columns()] + \
+               list(UserModel.relationships().keys())
+
 
 @latest.route('/users/authenticate/', methods=['POST'])
 @validate_json(required_fields=['email', 'password'])
@@ -46,15 +57,24 @@ def authenticate_user():
 
 
 @latest.route('/users/<user_id>', methods=['GET'])
-@limit(requests=100, window=60, by="ip")
+@limit(requests=100, window=60, by="ip", lease=10)
 def get_user(user_id):
     """
     Get a user by user id
 
+    'fields' is a comma separated list of the fields to return, e.g. 'id,user_name,preference'.
+
+    The response carries an ETag; send it back as If-None-Match to get
+    an empty 304 while the user is unchanged.
+
     **sample request**
 
         curl -X GET 'http://localhost:5000/users/1'
 
+        curl -X GET 'http://localhost:5000/users/1?fields=id,user_name,age,gender,profile_photo'
+
+        curl -X GET 'http://localhost:5000/users/1' --header 'If-None-Match: "1-3"'
+
     **sample response**
 
         {
@@ -85,24 +105,83 @@ def get_user(user_id):
 
     """
 
-    user = user_service.get_user_by_user_id(user_id)
+    # the user doc cache and the etag are keyed by the numeric id, e.g. '01' is user 1
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        raise Exception('Invalid user id.')
+
+    fields = _get_fields()
+
+    if request.if_none_match:
+        # the version alone tells whether the client's copy is current
+        version = user_service.get_user_version(user_id)
+        if version is not None and request.if_none_match.contains_weak(_user_etag(user_id, version, fields)):
+            return not_modified_response(_user_etag(user_id, version, fields))
+
+    user = user_service.get_user_doc_by_user_id(user_id)
 
     if user is None:
         raise Exception('Invalid user id.')
 
-    return jsonify_response(user=user.to_json(filter_hidden_columns=True))
+    etag = _user_etag(user_id, user['version'], fields)
+
+    # the cached doc has every field already decrypted, so it is cheaper to pick from it than to query
+    if fields is not None:
+        user = {key: value for key, value in user.items() if key in fields}
+
+    response = jsonify_response(user=user)
+    response.set_etag(etag)
+
+    return response
 
 
 @latest.route('/users/', methods=['GET'])
-@limit(requests=100, window=60, by="ip")
+@limit(requests=100, window=60, by="ip", lease=10)
 def get_qualified_users():
     """
     Get all users that fit the filter criteria
 
+    Pages are ordered by user id. Pass the returned 'next_cursor' as 'cursor'
+    to get the next page; 'page' is still supported but gets slower the deeper it goes.
+
+    'budget_min' and 'budget_max' are the caller's budget range; users whose budget range
+    overlaps it qualify, a missing bound is unbounded. 'household_size_min' and
+    'household_size_max' bound the household size.
+
+    'q' only keeps users whose short or long description contains all the words.
+
+    'fields' is a comma separated list of the fields to return, e.g. 'id,user_name,preference'.
+    Only those columns are loaded, so e.g. the encrypted email is not decrypted unless asked for.
+
+    With 'ids', a comma separated list of user ids, the filters are ignored and those users
+    are returned in the same order; ids that do not exist or are deleted are listed in 'missing_ids'.
+
+    The response carries an ETag; send it back as If-None-Match to get
+    an empty 304 while the page is unchanged.
+
+    With 'rank=compat' the caller must be authenticated, and the users are ordered
+    by mutual compatibility: how well each user fits the caller's preference and
+    how well the caller fits theirs. The privileged token passes the user to rank
+    for as 'user_id'. Ranking needs the match index, see Config.MATCH_INDEX_ENABLED.
+
     **sample request**
 
         curl -X GET 'http://localhost:5000/users/?age_group=35-40&gender=M'
 
+        curl -X GET 'http://localhost:5000/users/?age_group=35-40&gender=M&cursor=WzEyXQ'
+
+        curl -X GET 'http://localhost:5000/users/?gender=M&q=quiet+non+smoker'
+
+        curl -X GET 'http://localhost:5000/users/?gender=M&fields=id,user_name,age,gender,profile_photo'
+
+        curl -X GET 'http://localhost:5000/users/?ids=12,3,7'
+
+        curl -X GET 'http://localhost:5000/users/?budget_min=900&budget_max=1200&household_size_max=3'
+
+        curl -X GET 'http://localhost:5000/users/?gender=M&rank=compat'
+        --header "X-TOKEN: MDhjOTliMzg1Y2Q2NDA5ZTgwNzg4NGY3NjM1NTQ0M2U"
+
     **sample response**
 
         {
@@ -154,11 +233,251 @@ def get_qualified_users():
                                           "age_group": "25-30"
                                       }
                     }
-                ]
+                ],
+            "next_cursor": "WzEyXQ"
+            }
+        }
+
+    """
+    if 'ids' in request.args:
+        return _get_users_by_ids()
+
+    individual_preference, shared_preference, search_text = _get_search_filters()
+
+    page = request.args.get('page', default=1, type=int)
+    cursor = request.args.get('cursor', default=None)
+    rank = request.args.get('rank', default=None)
+    fields = _get_fields()
+
+    # ranked results depend on the caller, so only plain searches are cached
+    search_result_key = None
+    if not rank:
+        search_result_key = cache_helper.get_search_result_key(individual_preference,
+                                                               shared_preference,
+                                                               page,
+                                                               cursor,
+                                                               search_text,
+                                                               fields)
+
+        search_result = cache_helper.get_cached_search_result(search_result_key)
+        if search_result is not None:
+            if request.if_none_match.contains_weak(search_result['etag']):
+                return not_modified_response(search_result['etag'])
+
+            response = json_response(search_result['result'], precompressed=search_result['precompressed'])
+            response.set_etag(search_result['etag'])
+            return response
+
+    if rank == 'compat':
+        user_id = g.user_id
+        if authenticate():
+            # the privileged token ranks on behalf of the given user
+            user_id = request.args.get('user_id', default=None, type=int)
+            if user_id is None:
+                raise Exception(u'Parameter user_id is required to rank with the privileged token.')
+
+        users, next_cursor = user_service.get_compatible_users(user_id,
+                                                               individual_preference,
+                                                               shared_preference,
+                                                               page=page,
+                                                               cursor=cursor,
+                                                               search_text=search_text,
+                                                               fields=fields)
+    elif rank:
+        raise Exception(u'Invalid rank {0}.'.format(rank))
+    else:
+        users, next_cursor = user_service.get_qualified_users(individual_preference,
+                                                              shared_preference,
+                                                              page=page,
+                                                              cursor=cursor,
+                                                              search_text=search_text,
+                                                              fields=fields)
+
+    # the page is identified by its users' versions, so a match needs no serializing
+    etag = _users_etag(users, next_cursor, fields)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified_response(etag)
+
+    response = jsonify_response(users=raw_json_list(user_service.get_user_fragments(users, fields=fields)),
+                                next_cursor=next_cursor)
+    response.set_etag(etag)
+
+    if search_result_key:
+        response.precompressed = compression_helper.precompress(response.get_data())
+        cache_helper.cache_search_result(search_result_key,
+                                         response.get_data(),
+                                         etag=etag,
+                                         precompressed=response.precompressed)
+
+    return response
+
+
+@latest.route('/users/facets', methods=['GET'])
+@limit(requests=100, window=60, by="user", lease=10)
+def get_user_facets():
+    """
+    Get the number of users for every gender, education and age_group value
+
+    Takes the same filters as GET /users/. The counts of a facet apply every
+    filter except the facet's own, so they show what selecting a value would return.
+
+    **sample request**
+
+        curl -X GET 'http://localhost:5000/users/facets?gender=F&age_group=25-30'
+
+    **sample response**
+
+        {
+            "facets": {
+                "gender": {
+                    "M": 12,
+                    "F": 31
+                },
+                "education": {
+                    "H": 3,
+                    "C": 9,
+                    "G": 14,
+                    "B": 5
+                },
+                "age_group": {
+                    "18-21": 0,
+                    "21-25": 4,
+                    "25-30": 31,
+                    ...
+                }
             }
         }
 
     """
+
+    individual_preference, shared_preference, search_text = _get_search_filters()
+
+    facets_key = cache_helper.get_search_result_key('facets',
+                                                    individual_preference,
+                                                    shared_preference,
+                                                    search_text)
+
+    facets = cache_helper.get_cached_search_result(facets_key)
+    if facets is not None:
+        return json_response(facets['result'], precompressed=facets['precompressed'])
+
+    facets = user_service.get_facet_counts(individual_preference, shared_preference, search_text=search_text)
+    response = jsonify_response(facets=facets)
+    response.precompressed = compression_helper.precompress(response.get_data())
+
+    cache_helper.cache_search_result(facets_key,
+                                     response.get_data(),
+                                     precompressed=response.precompressed,
+                                     timeout_in_sec=FACET_COUNTS_TIMEOUT_IN_SECS)
+
+    return response
+
+
+@latest.route('/users/export', methods=['GET'])
+@limit(requests=10, window=60, by="user")
+@auth_required()
+def export_qualified_users():
+    """
+    Stream every user that fits the filter criteria as newline delimited json
+
+    Takes the same filters as GET /users/, without paging.
+
+    **sample request**
+
+        curl -X GET 'http://localhost:5000/users/export?gender=F&age_group=25-30'
+        --header "X-TOKEN: MDhjOTliMzg1Y2Q2NDA5ZTgwNzg4NGY3NjM1NTQ0M2U"
+
+    **sample response**
+
+        {"id": 1, "user_name": "test_user_name", "gender": "F", ...}
+        {"id": 4, "user_name": "another_user_name", "gender": "F", ...}
+
+    """
+
+    individual_preference, shared_preference, search_text = _get_search_filters()
+
+    users = user_service.iter_qualified_users(individual_preference, shared_preference, search_text=search_text)
+
+    return ndjson_response(user.to_json(filter_hidden_columns=True) for user in users)
+
+
+def _get_users_by_ids():
+    """
+    Get the users listed in 'ids', in the same order
+
+    :return: response with the 'users' and the 'missing_ids'
+    """
+
+    user_ids = []
+    for user_id in request.args.get('ids').split(','):
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise Exception(u'Invalid user id {0}.'.format(user_id))
+
+        if user_id not in user_ids:
+            user_ids.append(user_id)
+
+    if len(user_ids) > Config.BATCH_USER_IDS_MAX:
+        raise Exception(u'At most {0} ids are allowed.'.format(Config.BATCH_USER_IDS_MAX))
+
+    fields = _get_fields()
+
+    users, missing_ids = user_service.get_user_docs_by_user_ids(user_ids)
+
+    if fields is not None:
+        users = [{key: value for key, value in user.items() if key in fields} for user in users]
+
+    return jsonify_response(users=users, missing_ids=missing_ids)
+
+
+def _user_etag(user_id, version, fields=None):
+    if fields is None:
+        return u'{0}-{1}'.format(user_id, version)
+    return u'{0}-{1}-{2}'.format(user_id, version, '.'.join(fields))
+
+
+def _users_etag(users, next_cursor, fields=None):
+    """
+    Get the etag of a page of users from their ids and versions
+
+    :param users: list of user models
+    :param next_cursor:
+    :param fields: returned fields, None for all
+    :return: etag
+    """
+
+    page = [[user.id, user.version] for user in users] + [next_cursor, fields]
+    return hashlib.sha1(json.dumps(page).encode('UTF-8')).hexdigest()
+
+
+def _get_fields():
+    """
+    Get the user fields asked for with 'fields' from the query string
+
+    :return: sorted list of field names, None for all fields
+    """
+
+    fields = request.args.get('fields', default=None)
+
+    if not fields:
+        return None
+
+    fields = sorted(set(fields.split(',')))
+    for field in fields:
+        if field not in _USER_FIELDS:
+            raise Exception(u'Invalid field {0}.'.format(field))
+
+    return fields
+
+
+def _get_search_filters():
+    """
+    Get the user search filters from the query string
+
+    :return: (individual preference, shared preference, search text)
+    """
+
     individual_preference = {}
     shared_preference = {}
 
@@ -167,15 +486,56 @@ def get_qualified_users():
         if filter_value:
             individual_preference[filter] = filter_value
 
-    for filter in PreferenceModel.shared_preference_columns():
+    for filter in PreferenceModel.shared_preference_columns() + PreferenceModel.shared_preference_range_filters():
         filter_value = request.args.get(filter, default=None)
         if filter_value:
             shared_preference[filter] = filter_value
 
-    page = request.args.get('page', default=1)
+    search_text = request.args.get('q', default=None)
+
+    return individual_preference, shared_preference, search_text
+
+
+@latest.route('/users/<user_id>/matches', methods=['GET'])
+@limit(requests=100, window=60, by="ip")
+@auth_required('user_id')
+def get_user_matches(user_id):
+    """
+    Get the users most compatible with a user, most compatible first
+
+    The matches are precomputed and kept up to date as users change.
+
+    **sample request**
+
+        curl -X GET 'http://localhost:5000/users/1/matches?page=1'
+        --header "X-TOKEN: MDhjOTliMzg1Y2Q2NDA5ZTgwNzg4NGY3NjM1NTQ0M2U"
+
+    **sample response**
+
+        {
+            "matches":
+                [
+                    {
+                        "score": 87,
+                        "user": {
+                            "id": 12,
+                            "user_name": "test_user_name",
+                            ...
+                        }
+                    }
+                ]
+        }
+
+    """
+
+    page = request.args.get('page', default=1, type=int)
+
+    matches = user_service.get_user_matches(int(user_id), page=page)
+
+    fragments = user_service.get_user_fragments([user for user, _ in matches])
 
-    users = user_service.get_qualified_users(individual_preference, shared_preference, page=page)
-    return jsonify_response(users=[user.to_json(filter_hidden_columns=True) for user in users])
+    return jsonify_response(matches=raw_json_list([b'{"score": %d, "user": %s}' % (score, fragment)
+                                                   for (_, score), fragment in zip(matches, fragments)]))
 
 
 @latest.route('/users/', methods=['POST'])
@@ -1,3 +1,5 @@
+from config import Config
+
 from pyws.service import user_service
 from pyws.cache.redis_connector import RedisStore
 from pyws.cache import cache_helper
@@ -12,10 +14,13 @@ def authenticate_user(user_email, password):
     if not user or user.password != password:
         raise Exception('No user matching the email and password combination.')
 
-    # retrieve existing token from cache is exists
-    if _redis_store.exists(USER_TOKEN_KEY.format(user_id=user.id)):
-        token = _redis_store.get(USER_TOKEN_KEY.format(user_id=user.id))
-        cache_helper.extend_cached_auth_keys(token)
+    if Config.TOKEN_FORMAT == 'signed':
+        generation = cache_helper.get_session_generation_to_sign(user.id)
+        return string_helper.sign_token(user.id, generation, Config.SECRET_KEY, Config.SIGNED_TOKEN_TIMEOUT_IN_SECS)
+
+    # retrieve existing token from cache is exists, extending its session
+    token = _redis_store.get(USER_TOKEN_KEY.format(user_id=user.id))
+    if token is not None and cache_helper.resolve_session(token) == user.id:
         return token
 
     # create token
@@ -0,0 +1,185 @@
+import os
+import queue
+import threading
+
+from flask import current_app
+
+from pyws.data.user_data import UserData
+from pyws.data import compat_ranker
+from pyws.cache import cache_helper
+from pyws.cache.cache_constants import USER_MATCHES_TOP_K
+from config import Config
+
+_user_data = UserData()
+
+
+class MatchUpdateWorker(object):
+    """
+    Runs update_matches() for the scheduled users one at a time, on a single thread per process
+
+    Updates of the same process never race each other. The queue is bounded, and a
+    user that is already waiting is not queued again.
+    """
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._pending = None
+
+    def schedule(self, app, user_id):
+        """
+        Queue a match update
+
+        :param app: flask app the update runs in
+        :param user_id:
+        :return: False if the queue is full
+        """
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # first use in this process, or forked from one that had started a thread
+                self._queue = queue.Queue(maxsize=self._max_size)
+                self._pending = set()
+
+                thread = threading.Thread(target=self._work, args=(app, self._queue))
+                thread.daemon = True
+                thread.start()
+                self._pid = os.getpid()
+
+            if user_id in self._pending:
+                return True
+
+            try:
+                self._queue.put_nowait(user_id)
+            except queue.Full:
+                return False
+
+            self._pending.add(user_id)
+            return True
+
+    def _work(self, app, user_ids):
+        while True:
+            user_id = user_ids.get()
+
+            # a write from now on queues the user again
+            with self._lock:
+                self._pending.discard(user_id)
+
+            try:
+                with app.app_context():
+                    update_matches(user_id)
+            except Exception:
+                app.logger.exception(u'Match update of user {0} failed.'.format(user_id))
+
+
+_match_update_worker = MatchUpdateWorker(Config.MATCH_UPDATE_QUEUE_SIZE)
+
+
+def get_matches(user_id, page=1, per_page=Config.NUMBER_PER_PAGE):
+    """
+    Get a page of the precomputed matches of a user, computing them if they are missing
+
+    :param user_id:
+    :param page:
+    :param per_page:
+    :return: list of (user model, score)
+    """
+    start = (max(page, 1) - 1) * per_page
+    end = min(start + per_page, USER_MATCHES_TOP_K) - 1
+
+    if not cache_helper.cached_matches_exist(user_id):
+        _user_data.ensure_in_match_index(user_id)
+        recompute_user_matches(user_id)
+
+    matches = cache_helper.get_cached_matches(user_id, start, end)
+
+    users_by_id = {user.id: user for user in _user_data.get_users_by_ids([match_id for match_id, _ in matches])}
+    return [(users_by_id[match_id], score) for match_id, score in matches if match_id in users_by_id]
+
+
+def schedule_match_update(user_id):
+    """
+    Update the matches affected by a changed user in the background
+
+    :param user_id:
+    :return:
+    """
+    app = current_app._get_current_object()
+
+    if not _match_update_worker.schedule(app, user_id):
+        # the user's own matches are recomputed when read, the ones of others catch up on their next update
+        app.logger.warning(u'Match update queue is full, dropping the cached matches of user {0}.'.format(user_id))
+        cache_helper.delete_cached_matches(user_id)
+
+
+def update_matches(user_id):
+    """
+    Update the matches affected by a created, updated or deleted user
+
+    Compatibility is symmetric, so one scoring pass gives both the user's own
+    matches and the user's score in everybody else's matches. Only cached matches
+    that can change are touched: the ones holding the user, and the ones the user's
+    new score enters. Matches holding the user are patched in place while the user
+    stays at or above their last score; otherwise someone outside them may now rank
+    higher, so they are dropped and computed again when read.
+
+    :param user_id:
+    :return:
+    """
+    match_index = _user_data.get_match_index()
+
+    all_scores = None
+    if match_index.users >> user_id & 1:
+        columns = match_index.snapshot(compat_ranker.SCORE_COLUMNS)
+        all_scores = compat_ranker.score(match_index, columns, user_id)
+
+        recompute_user_matches(user_id)
+    else:
+        # the user is gone, drop it from everybody's matches
+        cache_helper.delete_cached_matches(user_id)
+
+    thresholds, holders = cache_helper.get_cached_matches_affected_by(user_id)
+    thresholds.pop(user_id, None)
+    holders = [holder_id for holder_id in holders if holder_id in thresholds]
+    old_scores = dict(zip(holders, cache_helper.get_scores_in_cached_matches(user_id, holders)))
+
+    patches = {}
+    dropped = []
+    for owner_id, threshold in thresholds.items():
+        score = 0
+        if all_scores is not None and match_index.users >> owner_id & 1:
+            score = int(all_scores[owner_id])
+
+        if old_scores.get(owner_id) is None:
+            # enters the matches by beating their last score
+            if score > 0 and score > threshold:
+                patches[owner_id] = score
+        elif score > 0 and score >= threshold:
+            patches[owner_id] = score
+        else:
+            dropped.append(owner_id)
+
+    cache_helper.add_to_cached_matches(user_id, patches)
+    cache_helper.delete_cached_matches(*dropped)
+
+    if all_scores is None:
+        cache_helper.delete_matched_by(user_id)
+
+
+def recompute_user_matches(user_id):
+    """
+    Recompute the top matches of a single user
+
+    :param user_id:
+    :return:
+    """
+    match_index = _user_data.get_match_index()
+
+    if not match_index.users >> user_id & 1:
+        cache_helper.delete_cached_matches(user_id)
+        return
+
+    ranked = compat_ranker.rank(match_index, user_id, match_index.users, 1, USER_MATCHES_TOP_K)
+    cache_helper.replace_cached_matches(user_id, ranked.items)
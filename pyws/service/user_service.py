@@ -1,11 +1,22 @@
+import time
+
 from pyws.data.user_data import UserData
+from pyws.service import match_service
 from pyws.helper import data_helper
+from pyws.helper import json_helper
 from pyws.cache import cache_helper
 from pyws.data.model.user_model import UserModel
 from pyws.data.model.preference_model import PreferenceModel
 
 _user_data = UserData()
 
+# user info fields that change compatibility scores
+_MATCH_FIELDS = ['gender', 'education', 'age', 'deleted', 'preference']
+
+# how long to wait for another process refilling a cached user doc
+_USER_DOC_WAIT_IN_SECS = 0.05
+_USER_DOC_WAIT_TIMES = 10
+
 
 def get_user_by_user_id(user_id, include_deleted=False):
     user = _user_data.get(user_id)
@@ -16,9 +27,130 @@ def get_user_by_user_id(user_id, include_deleted=False):
     return data_helper.filter_deleted_model(user)
 
 
-def get_qualified_users(individual_preference, shared_preference, page=1):
-    users = _user_data.get_qualified_users(individual_preference, shared_preference, page=page)
-    return users
+def get_user_doc_by_user_id(user_id):
+    """
+    Get the serialized user, including preference, reading through the cache
+
+    On a miss only one process loads the user from the db, the others wait
+    for the cache to be refilled rather than stampeding the db.
+
+    :param user_id:
+    :return: dictionary or None
+    """
+    doc = cache_helper.get_cached_user_doc(user_id)
+
+    for _ in range(_USER_DOC_WAIT_TIMES):
+        if doc is not None:
+            break
+
+        if cache_helper.lock_user_doc(user_id):
+            try:
+                doc = _load_user_doc(user_id)
+                if doc is not None:
+                    cache_helper.cache_user_doc(user_id, doc)
+            finally:
+                cache_helper.unlock_user_doc(user_id)
+            break
+
+        time.sleep(_USER_DOC_WAIT_IN_SECS)
+        doc = cache_helper.get_cached_user_doc(user_id)
+    else:
+        # the refill is taking too long, don't wait any longer
+        doc = doc or _load_user_doc(user_id)
+
+    if doc is None or doc['deleted']:
+        return None
+    return doc
+
+
+def get_user_docs_by_user_ids(user_ids):
+    """
+    Get many serialized users, reading through the cache
+
+    Cached users come from one MGET, the rest from one IN query.
+
+    :param user_ids: list of user ids
+    :return: (docs in the order of the user ids, ids that do not exist or are deleted)
+    """
+    docs = cache_helper.get_cached_user_docs(user_ids)
+
+    uncached_ids = [user_id for user_id, doc in zip(user_ids, docs) if doc is None]
+    if uncached_ids:
+        users = [data_helper.filter_deleted_model(user) for user in _user_data.get_many(uncached_ids)]
+        loaded = {user.id: user.to_json(filter_hidden_columns=True) for user in users if user is not None}
+        cache_helper.cache_user_docs(loaded)
+
+        docs = [doc if doc is not None else loaded.get(user_id) for user_id, doc in zip(user_ids, docs)]
+
+    found = [doc for doc in docs if doc is not None and not doc['deleted']]
+    missing_ids = [user_id for user_id, doc in zip(user_ids, docs) if doc is None or doc['deleted']]
+
+    return found, missing_ids
+
+
+def get_user_version(user_id):
+    return _user_data.get_version(user_id)
+
+
+def _load_user_doc(user_id):
+    user = _user_data.get(user_id)
+
+    if user is None:
+        return None
+    return user.to_json(filter_hidden_columns=True)
+
+
+def get_user_fragments(users, fields=None):
+    """
+    Get the serialized users for list responses, encoding only those not cached at their current version
+
+    :param users: list of user models
+    :param fields: fields to serialize, None for all
+    :return: list of json bytes, in the order of the users
+    """
+    fragments = cache_helper.get_cached_user_fragments([(user.id, user.version) for user in users], fields=fields)
+
+    missing = {}
+    for i, user in enumerate(users):
+        if fragments[i] is None:
+            fragments[i] = json_helper.dumps(user.to_json(filter_hidden_columns=True, fields=fields))
+            missing[(user.id, user.version)] = fragments[i]
+
+    if missing:
+        cache_helper.cache_user_fragments(missing, fields=fields)
+
+    return fragments
+
+
+def get_qualified_users(individual_preference, shared_preference, page=1, cursor=None, search_text=None,
+                        fields=None):
+    users, next_cursor = _user_data.get_qualified_users(individual_preference,
+                                                        shared_preference,
+                                                        page=page,
+                                                        cursor=cursor,
+                                                        search_text=search_text,
+                                                        fields=fields)
+    return users, next_cursor
+
+
+def iter_qualified_users(individual_preference, shared_preference, search_text=None):
+    return _user_data.iter_qualified_users(individual_preference, shared_preference, search_text=search_text)
+
+
+def get_facet_counts(individual_preference, shared_preference, search_text=None):
+    return _user_data.get_facet_counts(individual_preference, shared_preference, search_text=search_text)
+
+
+def get_compatible_users(user_id, individual_preference, shared_preference, page=1, cursor=None,
+                         search_text=None, fields=None):
+    users, next_cursor = _user_data.get_compatible_users(user_id,
+                                                         individual_preference,
+                                                         shared_preference,
+                                                         page=page,
+                                                         cursor=cursor,
+                                                         search_text=search_text,
+                                                         fields=fields)
+    return users, next_cursor
 
 
 def get_user_by_user_email(user_email):
@@ -42,14 +174,32 @@ def create_user(user_info):
     new_user = UserModel(user_info)
     new_user.preference = new_preference
 
-    return _user_data.create(new_user)
+    _user_data.create(new_user)
+    match_service.schedule_match_update(new_user.id)
+
+    return new_user
 
 
 def update_user(user, user_info):
-    return _user_data.update(user, user_info)
+    updated_user = _user_data.update(user, user_info)
+
+    if any(field in user_info for field in _MATCH_FIELDS):
+        match_service.schedule_match_update(updated_user.id)
+
+    return updated_user
+
+
+def get_user_matches(user_id, page=1):
+    return match_service.get_matches(user_id, page=page)
 
 
 def hard_delete_user(user):
+    user_id = user.id
+
     # hard delete the user from the db
-    cache_helper.delete_cached_auth_keys_by_user_id(user.id)
-    return _user_data.hard_delete(user)
+    cache_helper.revoke_sessions(user_id)
+    result = _user_data.hard_delete(user)
+
+    match_service.schedule_match_update(user_id)
+
+    return result
@@ -0,0 +1,42 @@
+"""
+Measure the bandwidth saved and the CPU spent compressing a GET /users/ page
+
+Run from the repository root:
+
+    python -m test.benchmarks.bench_compression
+"""
+import gzip
+import timeit
+import zlib
+
+from pyws.helper import json_helper
+from test.benchmarks.bench_to_json import build_page
+
+NUMBER = 500
+
+COMPRESSORS = {
+    'gzip': lambda data, level: gzip.compress(data, compresslevel=level),
+    'deflate': lambda data, level: zlib.compress(data, level)
+}
+
+
+def main():
+    body = json_helper.dumps({'users': [user.to_json(filter_hidden_columns=True) for user in build_page()],
+                              'next_cursor': 'WzEyXQ'})
+
+    print('{0:>10}: {1:6d} bytes'.format('raw', len(body)))
+
+    for encoding, compressor in sorted(COMPRESSORS.items()):
+        for level in [1, 6, 9]:
+            compressed = compressor(body, level)
+            secs = timeit.timeit(lambda: compressor(body, level), number=NUMBER)
+            print('{0:>10}: {1:6d} bytes, {2:5.1f}% saved, {3:8.1f} us per page (level {4})'.format(
+                encoding,
+                len(compressed),
+                100.0 * (1 - float(len(compressed)) / len(body)),
+                secs / NUMBER * 1e6,
+                level))
+
+
+if __name__ == '__main__':
+    main()
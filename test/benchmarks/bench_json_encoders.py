@@ -0,0 +1,37 @@
+"""
+Compare the installed json encoders on a GET /users/ page
+
+Run from the repository root:
+
+    python -m test.benchmarks.bench_json_encoders
+"""
+import timeit
+
+from pyws.helper import json_helper
+from test.benchmarks.bench_to_json import build_page
+
+NUMBER = 2000
+
+
+def main():
+    page = {'users': [user.to_json(filter_hidden_columns=True) for user in build_page()],
+            'next_cursor': 'WzEyXQ'}
+
+    expected = None
+    for name in json_helper.available_encoders():
+        dumps, loads = json_helper.get_encoder(name)
+
+        # every encoder must produce the same document
+        if expected is None:
+            expected = loads(dumps(page))
+        assert loads(dumps(page)) == expected
+
+        secs = timeit.timeit(lambda: dumps(page), number=NUMBER)
+        print('{0:>10}: {1:8.1f} us per {2} user page, {3} bytes'.format(name,
+                                                                      secs / NUMBER * 1e6,
+                                                                      len(page['users']),
+                                                                      len(dumps(page))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Time a full rebuild of the match index for growing numbers of users
+
+Run from the repository root:
+
+    python -m test.benchmarks.bench_match_index_load
+"""
+import random
+import timeit
+
+from pyws.data.match_index import MatchIndex
+
+NUMBER = 3
+
+COLUMNS = {
+    'gender': ['M', 'F'],
+    'education': ['H', 'B', 'M', 'D'],
+    'birth_year': None,
+    'budget_min': None,
+    'budget_max': None
+}
+
+
+def build_records(users):
+    random.seed(users)
+
+    records = []
+    for user_id in range(1, users + 1):
+        budget_min = random.choice([None, 500, 800, 1000, 1200])
+        records.append((user_id, {
+            'gender': random.choice(COLUMNS['gender']),
+            'education': random.choice(COLUMNS['education'] + [None]),
+            'birth_year': random.randint(1960, 2000),
+            'budget_min': budget_min,
+            'budget_max': budget_min + 500 if budget_min is not None else None
+        }))
+    return records
+
+
+def main():
+    for users in [20000, 50000, 100000]:
+        records = build_records(users)
+        secs = timeit.timeit(lambda: MatchIndex(COLUMNS).load(records), number=NUMBER)
+        print('{0:>7} users: {1:8.1f} ms per load'.format(users, secs / NUMBER * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Count the redis round trips of the rate limiter with and without leases
+
+Sends requests at a steady rate against a real redis, as configured in config.py.
+Run from the repository root:
+
+    python -m test.benchmarks.bench_rate_limit_leases
+"""
+import time
+import uuid
+
+from pyws.cache import cache_helper
+
+REQUESTS_PER_SEC = 50
+DURATION_IN_SEC = 4
+
+# generous enough that no request is limited
+LIMIT_REQUESTS = 1000
+LIMIT_WINDOW = 60
+
+
+class CountingScript(object):
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.script(*args, **kwargs)
+
+
+def main():
+    script = cache_helper._RATE_LIMIT_SCRIPT
+    counting_script = CountingScript(script)
+    cache_helper._RATE_LIMIT_SCRIPT = counting_script
+
+    try:
+        for lease in [1, 5, 10, 25]:
+            key = 'rl:bench:{0}'.format(uuid.uuid4().hex)
+            counting_script.calls = 0
+
+            number_of_requests = REQUESTS_PER_SEC * DURATION_IN_SEC
+            for _ in range(number_of_requests):
+                rate_limit = cache_helper.check_rate_limit(key, LIMIT_REQUESTS, LIMIT_WINDOW, lease=lease)
+                assert rate_limit.allowed
+                time.sleep(1.0 / REQUESTS_PER_SEC)
+
+            cache_helper._redis_store.delete(key)
+
+            print('lease {0:>3}: {1:4d} redis round trips for {2} requests ({3:5.1f}%)'.format(
+                lease,
+                counting_script.calls,
+                number_of_requests,
+                100.0 * counting_script.calls / number_of_requests))
+    finally:
+        cache_helper._RATE_LIMIT_SCRIPT = script
+
+
+if __name__ == '__main__':
+    main()
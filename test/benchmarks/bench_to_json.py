@@ -0,0 +1,136 @@
+"""
+Compare the compiled to_json() serializer against the implementation it replaced
+
+Run from the repository root:
+
+    python -m test.benchmarks.bench_to_json
+"""
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import inspect
+
+from pyws.data.model.base_model import BaseModel
+from pyws.data.model.user_model import UserModel
+from pyws.data.model.preference_model import PreferenceModel
+from pyws.helper import json_helper
+from config import Config
+
+NUMBER = 2000
+
+
+def baseline_to_json(self, filter_hidden_columns=False):
+    """
+    BaseModel.to_json() as it was before the serializer was compiled per model class
+    """
+
+    self.id # important: need to access id first to populate
+
+    unloaded = inspect(self).unloaded
+
+    jsonified_obj = {}
+    for key in self.__table__.columns.keys():
+        # deferred columns are left out unless they were loaded
+        if key in unloaded:
+            continue
+
+        if isinstance(getattr(self, key), datetime):
+            jsonified_obj[key] = getattr(self, key).isoformat()
+        else:
+            jsonified_obj[key] = getattr(self, key)
+
+    if '_relationships' in dir(self):
+        for key in self.relationships().keys():
+            if getattr(self, key):
+                if isinstance(getattr(self, key), list):
+                    jsonified_obj[key] = []
+                    for model in getattr(self, key):
+                        jsonified_obj[key].append(self.to_json(model, filter_hidden_columns))
+                else:
+                    jsonified_obj[key] = getattr(self, key).to_json(filter_hidden_columns)
+
+    if '_hidden_columns' in dir(self):
+        if filter_hidden_columns:
+            hidden_columns = self.hidden_columns()
+            for hidden_column in hidden_columns:
+                del jsonified_obj[hidden_column]
+
+    return jsonified_obj
+
+
+@contextmanager
+def baseline_installed():
+    """
+    Swap the baseline in on BaseModel, so related models are serialized by it too
+    """
+
+    compiled_to_json = BaseModel.to_json
+    BaseModel.to_json = baseline_to_json
+    try:
+        yield
+    finally:
+        BaseModel.to_json = compiled_to_json
+
+
+def build_page():
+    """
+    Build a page of fully populated users, like the ones returned by GET /users/
+    """
+
+    users = []
+    for i in range(Config.NUMBER_PER_PAGE):
+        user = UserModel({
+            'id': i + 1,
+            'user_name': u'user_{0}'.format(i),
+            'email': u'user_{0}@email.com'.format(i),
+            'phone': 5550000 + i,
+            'gender': 'F',
+            'short_description': u'Quiet, tidy and working from home.',
+            'long_description': u'Looking for a room close to the city centre. ' * 10,
+            'education': 'B',
+            'age': 28,
+            'birth_year': 1998,
+            'created_time': datetime.utcnow(),
+            'age_last_modified': datetime.utcnow(),
+            'deleted': False,
+            'last_deleted_time': None,
+            'password': u'password',
+            'profile_photo': None,
+            'search_vector': None
+        })
+        user.preference = PreferenceModel({
+            'id': i + 1,
+            'gender': 'M',
+            'education': 'B',
+            'age_group': '25-30',
+            'budget_max': 1200,
+            'budget_min': 900,
+            'household_size': 2,
+            'user_id': i + 1
+        })
+        users.append(user)
+    return users
+
+
+def main():
+    users = build_page()
+
+    def page_to_json():
+        return [user.to_json(True) for user in users]
+
+    with baseline_installed():
+        baseline_page = page_to_json()
+        baseline_secs = timeit.timeit(page_to_json, number=NUMBER)
+
+    # to_json() now leaves datetimes to the encoder
+    assert baseline_page == [json_helper.loads(json_helper.dumps(user)) for user in page_to_json()]
+
+    compiled_secs = timeit.timeit(page_to_json, number=NUMBER)
+
+    for name, secs in [('baseline', baseline_secs), ('compiled', compiled_secs)]:
+        print('{0:>10}: {1:8.1f} us per {2} user page'.format(name, secs / NUMBER * 1e6, len(users)))
+
+
+if __name__ == '__main__':
+    main()
@@ -29,7 +29,10 @@ class UserApi(object):
     def delete_user_photo(self, user_id, token):
         return network_helpers.http_request('/users/{0}/photos/'.format(user_id), token=token, verb='DELETE')
 
-    def get_quailified_users(self, filter_criteria):
+    def get_user_matches(self, user_id, token):
+        return network_helpers.http_request('/users/{0}/matches'.format(user_id), token=token, verb='GET')
+
+    def get_quailified_users(self, filter_criteria, token=None):
 
         query_param = []
         for filter in filter_criteria:
@@ -37,8 +40,31 @@ class UserApi(object):
 
         interface = '/users/?{0}'.format('&'.join(query_param))
 
+        return network_helpers.http_request(interface, token=token, verb='GET')
+
+    def get_user_facets(self, filter_criteria):
+
+        query_param = []
+        for filter in filter_criteria:
+            query_param.append('{0}={1}'.format(filter, filter_criteria[filter]))
+
+        interface = '/users/facets?{0}'.format('&'.join(query_param))
+
         return network_helpers.http_request(interface, verb='GET')
 
+    def export_qualified_users(self, token):
+        return network_helpers.http_request('/users/export', token=token, verb='GET')
+
+    def stream_qualified_users(self, filter_criteria, token):
+
+        query_param = []
+        for filter in filter_criteria:
+            query_param.append('{0}={1}'.format(filter, filter_criteria[filter]))
+
+        interface = '/users/export?{0}'.format('&'.join(query_param))
+
+        return network_helpers.get_url_response(interface, token=token)
+
     def get_password_reset_email(self, email):
 
         interface = '/password_reset_email/?email={0}'.format(email)
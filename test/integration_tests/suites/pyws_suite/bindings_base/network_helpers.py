@@ -23,6 +23,21 @@ def post_file_to_url(interface, token, files, headers=None, data=None):
     return response.json()
 
 
+def get_url_response(interface, token=None, headers=None):
+    """
+    Send a GET request and return the whole response, for checks on status and headers
+    """
+    if headers is None:
+        headers = {'X-TOKEN': token} if token else {}
+
+    if interface[0] == '/':
+        interface = interface[1:]
+
+    url = 'http://{0}:{1}/{2}'.format(HOST, PORT, interface)
+
+    return requests.get(url, verify=False, headers=headers)
+
+
 def http_request(interface, token=None, data='', headers=None, verb="POST"):
     urllib3.disable_warnings()
 
@@ -0,0 +1,122 @@
+import sys
+import unittest
+from threading import Thread, Event
+
+from test.integration_tests.test_config import TestConfig
+from api_bindings import user_api
+from bindings_base import network_helpers
+
+# limited to 10 requests in 60 secs by user
+LIMITED_INTERFACE = '/users/export'
+# limited to 100 requests in 60 secs by user, taken from redis 10 at a time
+LEASED_INTERFACE = '/users/facets'
+
+
+class RateLimiterTestSuite(unittest.TestCase):
+
+    user_api = None
+
+    # a new user every run, so every run has its own limit
+    test_user_info = {
+        'user_name': 'rate_limit_test',
+        'email': 'rate_limit_test@email.com',
+        'password': 'abcxyz'
+    }
+
+    test_user_id = None
+    test_user_token = None
+    privileged_token = TestConfig.PRIVILEGED_TOKEN
+
+    @classmethod
+    def setUpClass(cls):
+        cls.user_api = user_api.UserApi()
+
+        response = cls.user_api.create_user(cls.test_user_info)
+        cls.test_user_id = response['user']['id']
+
+        response = cls.user_api.authenticate_user(cls.test_user_info)
+        cls.test_user_token = response['token']
+
+    @classmethod
+    def tearDownClass(cls):
+        response = cls.user_api.hard_delete_user(cls.test_user_id, cls.privileged_token)
+        if 'success' not in response:
+            raise Exception('The test user was not deleted.')
+
+    def test_rate_limit_headers_pos(self):
+        """test the rate limit headers are in the response"""
+
+        response = network_helpers.get_url_response(LIMITED_INTERFACE, token=self.test_user_token)
+
+        self.assertEqual(response.headers['X-RateLimit-Limit'], '10')
+        self.assertIn('X-RateLimit-Remaining', response.headers)
+        self.assertIn('X-RateLimit-Reset', response.headers)
+
+    def test_rate_limit_is_exact_with_concurrent_requests_pos(self):
+        """test concurrent requests never get more than the remaining limit"""
+
+        response = network_helpers.get_url_response(LIMITED_INTERFACE, token=self.test_user_token)
+        remaining = int(response.headers['X-RateLimit-Remaining'])
+
+        number_of_requests = 30
+        start = Event()
+        status_codes = []
+
+        def send_request():
+            start.wait()
+            status_codes.append(network_helpers.get_url_response(LIMITED_INTERFACE,
+                                                                 token=self.test_user_token).status_code)
+
+        threads = [Thread(target=send_request) for _ in range(number_of_requests)]
+        for thread in threads:
+            thread.start()
+
+        # release every request at once
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes.count(200), remaining)
+        self.assertEqual(status_codes.count(400), number_of_requests - remaining)
+
+        response = network_helpers.get_url_response(LIMITED_INTERFACE, token=self.test_user_token)
+        self.assertEqual(response.json()['error']['msg'], 'Too many requests.')
+        self.assertEqual(response.headers['X-RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', response.headers)
+
+    def test_leased_rate_limit_with_concurrent_requests_pos(self):
+        """test concurrent requests get the whole limit when requests are leased, with a single server process"""
+
+        number_of_requests = 100
+        start = Event()
+        status_codes = []
+
+        def send_request():
+            start.wait()
+            status_codes.append(network_helpers.get_url_response(LEASED_INTERFACE,
+                                                                 token=self.test_user_token).status_code)
+
+        threads = [Thread(target=send_request) for _ in range(number_of_requests)]
+        for thread in threads:
+            thread.start()
+
+        # release every request at once
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        # no leased request is lost to another thread's lease
+        self.assertEqual(status_codes.count(200), number_of_requests)
+
+        response = network_helpers.get_url_response(LEASED_INTERFACE, token=self.test_user_token)
+        self.assertEqual(response.json()['error']['msg'], 'Too many requests.')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        suite = unittest.TestSuite()
+        suite.addTest(sys.argv[1])
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(RateLimiterTestSuite)
+
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,123 @@
+import sys
+import socket
+import time
+import unittest
+import uuid
+
+from config import Config
+from redis.exceptions import ConnectionError
+from pyws.cache import redis_connector
+
+
+class RedisConnectorTestSuite(unittest.TestCase):
+    """
+    Talks to the redis of config.py, like the server under test
+    """
+
+    redis_store = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redis_store = redis_connector.RedisStore()
+
+    def setUp(self):
+        # every test writes keys of its own
+        prefix = 'test:{0}'.format(uuid.uuid4().hex)
+        self.mapping = {'{0}:{1}'.format(prefix, i): str(i) for i in range(3)}
+
+    def tearDown(self):
+        self.redis_store.conn.delete(*self.mapping.keys())
+
+    def _create_pool(self, **kwargs):
+        return redis_connector.InstrumentedConnectionPool(host=Config.REDIS_HOST,
+                                                          port=Config.REDIS_PORT,
+                                                          db=Config.REDIS_DB,
+                                                          **kwargs)
+
+    def test_mset_pos(self):
+        """test successfully set many keys with a timeout"""
+
+        self.redis_store.mset(self.mapping, timeout_in_sec=60)
+
+        keys = list(self.mapping.keys())
+        self.assertEqual(self.redis_store.mget(keys), [self.mapping[key] for key in keys])
+        for key in keys:
+            self.assertGreater(self.redis_store.ttl(key), 0)
+            self.assertLessEqual(self.redis_store.ttl(key), 60)
+
+    def test_mset_permanent_pos(self):
+        """test successfully set many keys without a timeout"""
+
+        self.redis_store.mset(self.mapping, timeout_in_sec=None)
+
+        keys = list(self.mapping.keys())
+        self.assertEqual(self.redis_store.mget(keys), [self.mapping[key] for key in keys])
+        for key in keys:
+            self.assertEqual(self.redis_store.ttl(key), -1)
+
+    def test_mset_nothing_pos(self):
+        """test set no keys without a round trip"""
+
+        self.redis_store.mset({})
+
+        self.assertEqual(self.redis_store.mget([]), [])
+
+    def test_pool_timeout_neg(self):
+        """test a command waits for a free connection, then gives up when none is released in time"""
+
+        pool = self._create_pool(max_connections=1, timeout=0.1)
+        stats = redis_connector.get_redis_stats()
+
+        connection = pool.get_connection('GET')
+        with self.assertRaises(ConnectionError):
+            pool.get_connection('GET')
+
+        new_stats = redis_connector.get_redis_stats()
+        self.assertEqual(new_stats['pool_waits'], stats['pool_waits'] + 1)
+        self.assertEqual(new_stats['pool_timeouts'], stats['pool_timeouts'] + 1)
+
+        # the released connection is handed out again
+        pool.release(connection)
+        self.assertIs(pool.get_connection('GET'), connection)
+
+    def test_health_check_of_idle_connection_pos(self):
+        """test a broken connection that sat idle is reconnected before it is handed out"""
+
+        pool = self._create_pool(max_connections=1, health_check_interval_in_sec=1)
+        client = redis_connector.InstrumentedRedis(connection_pool=pool)
+        self.assertTrue(client.ping())
+
+        connection = pool.get_connection('PING')
+        connection._sock.shutdown(socket.SHUT_RDWR)
+        pool.release(connection)
+
+        time.sleep(1)
+        self.assertIs(pool.get_connection('PING'), connection)
+        self.assertIsNone(connection._sock)
+
+        pool.release(connection)
+        self.assertTrue(client.ping())
+
+    def test_health_check_of_busy_connection_pos(self):
+        """test a connection used within the health check interval is handed out without a ping"""
+
+        pool = self._create_pool(max_connections=1, health_check_interval_in_sec=3600)
+        client = redis_connector.InstrumentedRedis(connection_pool=pool)
+        self.assertTrue(client.ping())
+
+        connection = pool.get_connection('PING')
+        sock = connection._sock
+        pool.release(connection)
+
+        self.assertIs(pool.get_connection('PING'), connection)
+        self.assertIs(connection._sock, sock)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        suite = unittest.TestSuite()
+        suite.addTest(sys.argv[1])
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(RedisConnectorTestSuite)
+
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,102 @@
+import sys
+import unittest
+
+from test.integration_tests.test_config import TestConfig
+from api_bindings import user_api
+from pyws.helper import string_helper
+
+# the privileged token is the SECRET_KEY of the server, which signs the session tokens
+SECRET_KEY = TestConfig.PRIVILEGED_TOKEN
+
+
+class SignedTokensTestSuite(unittest.TestCase):
+
+    user_api = None
+
+    test_user_info = {
+        'user_name': 'signed_token_test',
+        'email': 'signed_token_test@email.com',
+        'password': 'abcxyz'
+    }
+
+    test_user_id = None
+    privileged_token = TestConfig.PRIVILEGED_TOKEN
+
+    @classmethod
+    def setUpClass(cls):
+        cls.user_api = user_api.UserApi()
+
+        response = cls.user_api.create_user(cls.test_user_info)
+        cls.test_user_id = response['user']['id']
+
+    @classmethod
+    def tearDownClass(cls):
+        response = cls.user_api.hard_delete_user(cls.test_user_id, cls.privileged_token)
+        if 'success' not in response:
+            raise Exception('The test user was not deleted.')
+
+    def test_verify_signed_token_pos(self):
+        """test a signed token gives back its user id and session generation"""
+
+        token = string_helper.sign_token(1, 2, SECRET_KEY, 60)
+
+        self.assertTrue(string_helper.is_signed_token(token))
+        self.assertEqual(string_helper.verify_signed_token(token, SECRET_KEY), (1, 2))
+
+    def test_verify_tampered_signed_token_neg(self):
+        """test a signed token with a changed user id, generation or signature is rejected"""
+
+        token = string_helper.sign_token(1, 2, SECRET_KEY, 60)
+        user_id, generation, expires_at, signature = token.split('.')
+
+        for tampered_token in ['2.{0}.{1}.{2}'.format(generation, expires_at, signature),
+                               '1.3.{0}.{1}'.format(expires_at, signature),
+                               '1.2.{0}.{1}'.format(int(expires_at) + 60000, signature),
+                               '1.2.{0}.{1}'.format(expires_at, signature[::-1])]:
+            self.assertIsNone(string_helper.verify_signed_token(tampered_token, SECRET_KEY))
+
+    def test_verify_signed_token_with_wrong_key_neg(self):
+        """test a signed token is rejected with another secret key"""
+
+        token = string_helper.sign_token(1, 2, SECRET_KEY, 60)
+
+        self.assertIsNone(string_helper.verify_signed_token(token, 'another-secret-key'))
+
+    def test_verify_expired_signed_token_neg(self):
+        """test an expired signed token is rejected"""
+
+        token = string_helper.sign_token(1, 2, SECRET_KEY, -1)
+
+        self.assertIsNone(string_helper.verify_signed_token(token, SECRET_KEY))
+
+    def test_revoke_signed_token_on_password_change_pos(self):
+        """test a signed token authenticates until the password changes"""
+
+        # the test user was never revoked, so its session generation is 0
+        token = string_helper.sign_token(self.test_user_id, 0, SECRET_KEY, 60)
+
+        response = self.user_api.update_user(self.test_user_id, {'user_name': 'signed_token_test_2'}, token)
+        self.assertIn('success', response)
+
+        response = self.user_api.update_user(self.test_user_id, {'password': 'xyzabc'}, token)
+        self.assertIn('success', response)
+
+        response = self.user_api.update_user(self.test_user_id, {'user_name': 'signed_token_test_3'}, token)
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Authentication required.')
+
+        # tokens of the bumped generation are valid again
+        token = string_helper.sign_token(self.test_user_id, 1, SECRET_KEY, 60)
+
+        response = self.user_api.update_user(self.test_user_id, {'user_name': 'signed_token_test_3'}, token)
+        self.assertIn('success', response)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        suite = unittest.TestSuite()
+        suite.addTest(sys.argv[1])
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(SignedTokensTestSuite)
+
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,41 @@
+import sys
+import unittest
+
+from test.integration_tests.test_config import TestConfig
+from bindings_base import network_helpers
+
+
+class StatsTestSuite(unittest.TestCase):
+
+    privileged_token = TestConfig.PRIVILEGED_TOKEN
+
+    def test_get_stats_pos(self):
+        """test successfully get the cache stats with the privileged token"""
+
+        response = network_helpers.http_request('/stats/', token=self.privileged_token, verb='GET')
+
+        self.assertIn('local_cache', response)
+        self.assertIn('hit_rate', response['local_cache']['user_doc'])
+
+        self.assertIn('redis', response)
+        self.assertIn('pool_timeouts', response['redis'])
+        # the privileged token was resolved in redis at least once
+        self.assertGreater(len(response['redis']['commands']), 0)
+
+    def test_get_stats_without_privileged_token_neg(self):
+        """test get the cache stats without the privileged token"""
+
+        response = network_helpers.http_request('/stats/', token=None, verb='GET')
+
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Privileged token required.')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        suite = unittest.TestSuite()
+        suite.addTest(sys.argv[1])
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(StatsTestSuite)
+
+    unittest.TextTestRunner(verbosity=2).run(suite)
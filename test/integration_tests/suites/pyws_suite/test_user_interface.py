@@ -1,4 +1,5 @@
 import sys, os
+import json
 import unittest
 from datetime import datetime, timedelta
 
@@ -50,6 +51,13 @@ class UserTestSuite(unittest.TestCase):
         self.assertIn('user', response)
         self.assertIn('preference', response['user'])
 
+    def test_get_user_with_leading_zero_pos(self):
+        """test a user id with a leading zero gets the same user"""
+
+        response = self.user_api.get_user('0{0}'.format(self.test_user_id))
+        self.assertIn('user', response)
+        self.assertEqual(response['user']['id'], self.test_user_id)
+
     def test_get_user_non_existing_user_neg(self):
         """test get a user that does not exist"""
 
@@ -172,6 +180,27 @@ class UserTestSuite(unittest.TestCase):
                          "These fields {'preference': ['pref_test']} "
                          "are not allowed in the json payload.")
 
+    def test_create_user_with_invalid_values_neg(self):
+        """test create user with values that do not fit the columns"""
+
+        user_info = {
+            'user_name': 'integration_test',
+            'email': 'integration_test@email.com',
+            'password': 'abcxyz',
+            'preference': {
+                'gender': 'X'
+            }
+        }
+        response = self.user_api.create_user(user_info)
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Field gender must be one of [ M, F ].')
+
+        user_info['preference']['gender'] = 'F'
+        user_info['age'] = 'thirty'
+        response = self.user_api.create_user(user_info)
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Field age must be an integer.')
+
     def test_create_user_without_valid_json_payload_neg(self):
         """test create user without a valid json payload"""
 
@@ -233,6 +262,9 @@ class UserTestSuite(unittest.TestCase):
             self.assertNotEqual(get_response['user']['age_last_modified'],
                                 create_response['user']['age_last_modified'])
 
+            # make sure the version, which the etag is built from, is bumped
+            self.assertGreater(get_response['user']['version'], create_response['user']['version'])
+
             # make sure preference is created
             self.assertIn('preference', get_response['user'])
             # make sure preference is created
@@ -351,6 +383,244 @@ class UserTestSuite(unittest.TestCase):
         self.assertIn('users', response)
         self.assertEqual(1, len(response['users']))
 
+    def test_get_qualified_users_with_cursor_pos(self):
+        """test the cursor returned with a page leads past that page"""
+
+        # more users than fit on two pages, found by a word only they have
+        user_ids = []
+        try:
+            for i in range(20):
+                create_response = self.user_api.create_user({
+                    'user_name': 'cursor_test_{0}'.format(i),
+                    'email': 'cursor_test_{0}@email.com'.format(i),
+                    'password': 'abcxyz',
+                    'short_description': 'Cursorpagingtest roommate'
+                })
+                user_ids.append(create_response['user']['id'])
+
+            response = self.user_api.get_quailified_users({'q': 'cursorpagingtest'})
+            self.assertIn('users', response)
+            self.assertTrue(response['next_cursor'])
+            first_page = [user['id'] for user in response['users']]
+
+            next_response = self.user_api.get_quailified_users({'q': 'cursorpagingtest',
+                                                                'cursor': response['next_cursor']})
+            self.assertIn('users', next_response)
+            second_page = [user['id'] for user in next_response['users']]
+
+            # ids keep increasing within and across pages, so the pages are disjoint
+            self.assertTrue(second_page)
+            self.assertEqual(first_page + second_page, sorted(first_page + second_page))
+            self.assertGreater(second_page[0], first_page[-1])
+
+            # following every cursor finds each user once
+            self.assertEqual(self._get_all_qualified_user_ids({'q': 'cursorpagingtest'}), sorted(user_ids))
+
+        finally:
+            # hard delete these users
+            for user_id in user_ids:
+                response = self.user_api.hard_delete_user(user_id, self.privileged_token)
+                self.assertIn('success', response)
+
+    def test_get_qualified_users_with_invalid_cursor_neg(self):
+        """test get qualified users with a cursor that cannot be decoded"""
+
+        response = self.user_api.get_quailified_users({'cursor': 'not-a-cursor'})
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Invalid cursor not-a-cursor.')
+
+        # a negative last id, i.e. encode_cursor(-5)
+        response = self.user_api.get_quailified_users({'cursor': 'Wy01XQ'})
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Invalid cursor Wy01XQ.')
+
+    def _get_all_qualified_user_ids(self, filter_criteria):
+        """follow the cursors through every page of qualified users"""
+
+        user_ids = []
+        filter_criteria = dict(filter_criteria)
+
+        while True:
+            response = self.user_api.get_quailified_users(filter_criteria)
+            self.assertIn('users', response)
+            user_ids.extend(user['id'] for user in response['users'])
+
+            if not response['next_cursor']:
+                return user_ids
+            filter_criteria['cursor'] = response['next_cursor']
+
+    def test_get_qualified_users_with_budget_overlap_pos(self):
+        """test users whose budget range overlaps the requested one qualify"""
+
+        user_info = {
+            'user_name': 'integration_test',
+            'email': 'integration_test@email.com',
+            'password': 'abcxyz',
+            'preference': {
+                'budget_min': 1000,
+                'budget_max': 1500
+            }
+        }
+
+        create_response = self.user_api.create_user(user_info)
+
+        try:
+            user_ids = self._get_all_qualified_user_ids({'budget_min': 900, 'budget_max': 1200})
+            self.assertIn(create_response['user']['id'], user_ids)
+
+            user_ids = self._get_all_qualified_user_ids({'budget_min': 1600})
+            self.assertNotIn(create_response['user']['id'], user_ids)
+
+        finally:
+            # hard delete this user
+            response = self.user_api.hard_delete_user(create_response['user']['id'], self.privileged_token)
+            self.assertIn('success', response)
+
+    def test_get_qualified_users_with_search_text_pos(self):
+        """test full text search combined with the filter criteria"""
+
+        filter_criteria = {
+            'gender': 'M',
+            'q': 'unmatchablesearchword'
+        }
+        response = self.user_api.get_quailified_users(filter_criteria)
+
+        self.assertIn('users', response)
+        self.assertEqual(0, len(response['users']))
+
+    def test_get_qualified_users_with_search_text_in_description_pos(self):
+        """test full text search returns the user whose description contains the words"""
+
+        user_info = {
+            'user_name': 'integration_test',
+            'email': 'integration_test@email.com',
+            'password': 'abcxyz',
+            'gender': 'M',
+            'short_description': 'Quiet xylophonist looking for a room',
+            'long_description': 'Practices with headphones on.'
+        }
+
+        create_response = self.user_api.create_user(user_info)
+
+        try:
+            response = self.user_api.get_quailified_users({'gender': 'M', 'q': 'xylophonist+headphones'})
+            self.assertIn('users', response)
+            self.assertEqual([user['id'] for user in response['users']], [create_response['user']['id']])
+
+        finally:
+            # hard delete this user
+            response = self.user_api.hard_delete_user(create_response['user']['id'], self.privileged_token)
+            self.assertIn('success', response)
+
+    def test_get_qualified_users_with_fields_pos(self):
+        """test only the requested fields are returned"""
+
+        response = self.user_api.get_quailified_users({'gender': 'M', 'fields': 'id,user_name'})
+
+        self.assertIn('users', response)
+        for user in response['users']:
+            self.assertEqual(sorted(user.keys()), ['id', 'user_name'])
+
+    def test_get_qualified_users_with_invalid_fields_neg(self):
+        """test get qualified users with a field that cannot be returned"""
+
+        response = self.user_api.get_quailified_users({'fields': 'id,password'})
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Invalid field password.')
+
+    def test_get_users_by_ids_pos(self):
+        """test get users by ids keeps the requested order and reports missing ids"""
+
+        response = self.user_api.get_quailified_users({'ids': '-1,{0}'.format(self.test_user_id)})
+
+        self.assertIn('users', response)
+        self.assertEqual([user['id'] for user in response['users']], [self.test_user_id])
+        self.assertEqual(response['missing_ids'], [-1])
+
+    def test_get_user_facets_pos(self):
+        """test successfully get the facet counts given the filter criteria"""
+
+        filter_criteria = {
+            'gender': 'M',
+            'age_group': '25-30'
+        }
+        response = self.user_api.get_user_facets(filter_criteria)
+
+        self.assertIn('facets', response)
+        for facet in ['gender', 'education', 'age_group']:
+            self.assertIn(facet, response['facets'])
+
+        # the gender facet ignores the gender filter, the others apply it
+        self.assertGreaterEqual(response['facets']['gender']['M'], 1)
+        self.assertGreaterEqual(response['facets']['age_group']['25-30'], 1)
+
+    def test_export_qualified_users_pos(self):
+        """test successfully stream the qualified users as newline delimited json"""
+
+        response = self.user_api.stream_qualified_users({'gender': 'M'}, self.test_user_token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('application/x-ndjson'))
+
+        users = [json.loads(line) for line in response.text.splitlines()]
+        self.assertIn(self.test_user_id, [user['id'] for user in users])
+        for user in users:
+            self.assertEqual(user['gender'], 'M')
+            self.assertNotIn('password', user)
+
+        # the test user is filtered out
+        response = self.user_api.stream_qualified_users({'gender': 'F'}, self.test_user_token)
+
+        self.assertEqual(response.status_code, 200)
+        users = [json.loads(line) for line in response.text.splitlines()]
+        self.assertNotIn(self.test_user_id, [user['id'] for user in users])
+
+    def test_export_qualified_users_without_auth_neg(self):
+        """test export users without authentication token"""
+
+        response = self.user_api.export_qualified_users(None)
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Authentication required.')
+
+    def test_get_compatible_users_pos(self):
+        """test ranking users by compatibility with the user's token and with the privileged token"""
+
+        response = self.user_api.get_quailified_users({'rank': 'compat'}, self.test_user_token)
+        self.assertIn('users', response)
+
+        response = self.user_api.get_quailified_users({'rank': 'compat', 'user_id': self.test_user_id},
+                                                      self.privileged_token)
+        self.assertIn('users', response)
+
+        response = self.user_api.get_quailified_users({'rank': 'compat'}, self.privileged_token)
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'],
+                         'Parameter user_id is required to rank with the privileged token.')
+
+    def test_get_compatible_users_without_auth_neg(self):
+        """test ranking users by compatibility without authentication token"""
+
+        response = self.user_api.get_quailified_users({'rank': 'compat'})
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Authentication required.')
+
+    def test_get_user_matches_pos(self):
+        """test successfully get the matches of the test user"""
+
+        response = self.user_api.get_user_matches(self.test_user_id, self.test_user_token)
+        self.assertIn('matches', response)
+
+        # the user never matches itself
+        for match in response['matches']:
+            self.assertNotEqual(match['user']['id'], self.test_user_id)
+
+    def test_get_user_matches_without_auth_neg(self):
+        """test get matches of the test user without authentication token"""
+
+        response = self.user_api.get_user_matches(self.test_user_id, None)
+        self.assertIn('error', response)
+        self.assertEqual(response['error']['msg'], 'Authentication required.')
+
     def test_send_password_reset_email_pos(self):
         """test get success in the api response"""
 